@@ -1,18 +1,150 @@
 """AI Identifier API - Uses OpenAI Vision + eBay market data to identify antiques and estimate value"""
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import Optional
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError, field_validator
+from typing import AsyncIterator, Callable, Literal, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import bisect
+import hashlib
 import json
+import logging
+import random
+import re
 import httpx
+import orjson
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.models.item import ItemCategory
 from app.services.ebay import ebay_client, EbayMarketData
+from app.services.images import prepare_image, split_data_url
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+OPENAI_CHAT_URL = "https://api.openai.com/v1/chat/completions"
+
+# Shared client for OpenAI calls so TCP/TLS connections are reused across requests.
+# Created lazily and closed by the app lifespan (see main.py).
+_client: Optional[httpx.AsyncClient] = None
+
+
+def openai_timeout(read: float) -> httpx.Timeout:
+    """Per-call read timeout; connecting and waiting for a pooled connection should fail fast regardless"""
+    return httpx.Timeout(read, connect=10.0, write=30.0, pool=5.0)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared pooled HTTP client, creating it on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        # HTTP/2 multiplexes concurrent OpenAI calls over a few connections, so the pool can stay
+        # small; it still has headroom if the server ever negotiates HTTP/1.1 instead.
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=openai_timeout(90.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+        )
+    return _client
+
+
+async def close_http_client():
+    """Close the shared HTTP client (called on app shutdown)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+# Rate limits and server errors from OpenAI are usually transient, so retry them with backoff
+OPENAI_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+OPENAI_MAX_ATTEMPTS = 4
+OPENAI_MAX_BACKOFF = 10.0
+# Bursts wait here instead of piling onto the account's rate limit, where queued requests tail out badly
+_openai_semaphore = asyncio.Semaphore(settings.openai_max_concurrent)
+
+
+def openai_retry_delay(response: Optional[httpx.Response], attempt: int) -> float:
+    """Seconds to wait before retry number `attempt`: OpenAI's retry-after(-ms) if sent, else jittered exponential backoff"""
+    headers = response.headers if response is not None else {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value:
+            try:
+                return min(max(float(value) * scale, 0.0), OPENAI_MAX_BACKOFF)
+            except ValueError:
+                pass
+    return min(2 ** (attempt - 1) + random.random(), OPENAI_MAX_BACKOFF)
+
+
+@asynccontextmanager
+async def send_openai(payload: dict, timeout: float, stream: bool = False) -> AsyncIterator[httpx.Response]:
+    """
+    POST a chat completion request, retrying 429/5xx responses and failed connections.
+    Use as `async with send_openai(...) as response:` - the response is closed on exit, and one of the
+    settings.openai_max_concurrent slots is held until then, so a streamed generation counts for its whole length.
+    """
+    client = get_http_client()
+    request = client.build_request(
+        "POST",
+        OPENAI_CHAT_URL,
+        timeout=openai_timeout(timeout),
+        headers={
+            "Authorization": f"Bearer {settings.openai_api_key}",
+            "Content-Type": "application/json"
+        },
+        json=payload
+    )
+    for attempt in range(1, OPENAI_MAX_ATTEMPTS + 1):
+        # The slot is released while backing off, so waiting retries don't block other requests
+        async with _openai_semaphore:
+            try:
+                response = await client.send(request, stream=stream)
+            except httpx.ConnectError:
+                # Nothing reached OpenAI, so retrying can't double-bill
+                if attempt == OPENAI_MAX_ATTEMPTS:
+                    raise
+                response = None
+            if response is not None:
+                try:
+                    if response.status_code not in OPENAI_RETRY_STATUSES or attempt == OPENAI_MAX_ATTEMPTS:
+                        yield response
+                        return
+                finally:
+                    await response.aclose()
+        
+        delay = openai_retry_delay(response, attempt)
+        if response is None:
+            logger.warning("Could not connect to OpenAI, retrying in %.1fs", delay)
+        else:
+            logger.warning("OpenAI returned %s, retrying in %.1fs", response.status_code, delay)
+        await asyncio.sleep(delay)
+
+
+async def iter_stream_content(response: httpx.Response) -> AsyncIterator[str]:
+    """Yield the text deltas from a streamed chat completion"""
+    async for line in response.aiter_lines():
+        if not line.startswith("data: "):
+            continue
+        data = line[len("data: "):]
+        if data == "[DONE]":
+            break
+        choices = orjson.loads(data).get("choices") or [{}]
+        delta = choices[0].get("delta", {}).get("content")
+        if delta:
+            yield delta
+
+
+def sse_event(event: str, data: str) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {data}\n\n"
 
 
 class IdentifyRequest(BaseModel):
     image: str  # Base64 encoded image or URL
     additional_context: Optional[str] = None  # Any notes about the item
+    detail: Literal["low", "high", "auto"] = "auto"  # Vision detail level; "auto" picks from image size
+    refine_with_llm: bool = False  # Opt in to a second AI call that re-prices against eBay data when the estimate looks off
 
 
 class EbayComparable(BaseModel):
@@ -20,6 +152,9 @@ class EbayComparable(BaseModel):
     price: float
     condition: str
     url: str
+    
+    class Config:
+        frozen = True
 
 
 class MarketDataResponse(BaseModel):
@@ -31,12 +166,23 @@ class MarketDataResponse(BaseModel):
     max_price: float
     median_price: float
     comparables: list[EbayComparable]
+    
+    class Config:
+        frozen = True
+
+
+def normalize_category(value) -> ItemCategory:
+    """Map the model's category text onto an inventory category (anything unrecognised is OTHER)"""
+    try:
+        return ItemCategory(str(value).strip().lower().replace(" ", "_"))
+    except ValueError:
+        return ItemCategory.OTHER
 
 
 class IdentifyResponse(BaseModel):
     item_name: str
     description: str
-    category: str
+    category: ItemCategory
     era_period: str
     estimated_value_low: float
     estimated_value_high: float
@@ -47,6 +193,40 @@ class IdentifyResponse(BaseModel):
     confidence: str
     # New: Market data from eBay
     market_data: Optional[MarketDataResponse] = None
+    
+    class Config:
+        frozen = True
+    
+    @field_validator("category", mode="before")
+    @classmethod
+    def coerce_category(cls, value):
+        return normalize_category(value)
+
+
+class QuickValueResult(BaseModel):
+    """The fields of a quick identification that /quick-value and the eBay search read"""
+    item_name: str
+    keywords: list[str]
+    category: ItemCategory
+    estimated_value_low: float
+    estimated_value_high: float
+    suggested_price: float
+    confidence: Optional[str] = None
+    
+    @field_validator("category", mode="before")
+    @classmethod
+    def coerce_category(cls, value):
+        return normalize_category(value)
+
+
+def model_response(content: BaseModel | list[BaseModel]) -> ORJSONResponse:
+    """
+    Serialize response models we've already built (and validated where the data came from the AI).
+    Returning a Response skips FastAPI re-validating them against response_model, which still documents the schema.
+    """
+    if isinstance(content, list):
+        return ORJSONResponse([model.model_dump(mode="json") for model in content])
+    return ORJSONResponse(content.model_dump(mode="json"))
 
 
 SYSTEM_PROMPT = """You are an expert antique and vintage item appraiser with decades of experience.
@@ -71,6 +251,7 @@ Low-end items might be $5-20, mid-range $20-100, higher-end pieces $100+.
 Respond in JSON format only, with these exact fields:
 {
     "item_name": "Specific name of item",
+    "keywords": ["keyword1", "keyword2", "keyword3"],
     "description": "Detailed description including style, materials, approximate age",
     "category": "One of: furniture, art, vases, figurines, knick_knacks, jewelry, pottery, glassware, textiles, books, collectibles, vintage_decor, kitchenware, lighting, mirrors, clocks, other",
     "era_period": "Approximate era (e.g., '1950s', 'Mid-Century Modern', 'Victorian', 'Art Deco')",
@@ -79,7 +260,6 @@ Respond in JSON format only, with these exact fields:
     "suggested_price": 18.00,
     "condition_notes": "Notes about condition based on what's visible",
     "selling_tips": "Tips for selling this item - what buyers look for, how to display it",
-    "keywords": ["keyword1", "keyword2", "keyword3"],
     "confidence": "high/medium/low"
 }"""
 
@@ -112,40 +292,211 @@ Provide revised estimates in JSON format:
     "market_analysis": "Brief analysis of how eBay data influenced your estimate"
 }}"""
 
+# System messages never change, so build them once rather than on every request
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+REFINE_SYSTEM_MESSAGE = {"role": "system", "content": "You are an antique pricing expert. Respond only in valid JSON."}
 
-async def search_ebay_for_item(keywords: list[str], item_name: str) -> Optional[EbayMarketData]:
-    """Search eBay for completed sales of similar items"""
-    if not ebay_client.is_configured:
+
+class RefinedEstimate(BaseModel):
+    """Revised prices from the refinement call"""
+    estimated_value_low: float
+    estimated_value_high: float
+    suggested_price: float
+    market_analysis: str
+    
+    class Config:
+        extra = "forbid"
+
+
+# Structured output: the model has to reply with exactly this schema, no fences or prose
+REFINE_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "refined_estimate", "schema": RefinedEstimate.model_json_schema(), "strict": True}
+}
+
+
+# /quick-value only needs a name and price, so ask for just the fields it returns (plus keywords for the eBay search)
+QUICK_VALUE_PROMPT = """You are an expert antique and vintage item appraiser.
+Identify the item in the image and estimate its resale value in a Florida antique store/booth
+(typical markup of 2-3x). Be realistic - this is for actual resale, not insurance value.
+
+Respond in JSON format only, with these exact fields:
+{
+    "item_name": "Specific name of item",
+    "keywords": ["keyword1", "keyword2", "keyword3"],
+    "category": "One of: furniture, art, vases, figurines, knick_knacks, jewelry, pottery, glassware, textiles, books, collectibles, vintage_decor, kitchenware, lighting, mirrors, clocks, other",
+    "estimated_value_low": 10.00,
+    "estimated_value_high": 25.00,
+    "suggested_price": 18.00,
+    "confidence": "high/medium/low"
+}"""
+QUICK_VALUE_SYSTEM_MESSAGE = {"role": "system", "content": QUICK_VALUE_PROMPT}
+QUICK_VALUE_MAX_TOKENS = 200
+
+
+# Opening markdown fence the models like to wrap JSON in
+_FENCE_RE = re.compile(r"```(?:json)?")
+_json_decoder = json.JSONDecoder()
+
+
+def parse_ai_json(content: str):
+    """Parse the JSON object/array in a model reply, ignoring markdown fences and surrounding prose"""
+    fence = _FENCE_RE.search(content)
+    start = fence.end() if fence else 0
+    brackets = [i for i in (content.find("{", start), content.find("[", start)) if i != -1]
+    if brackets:
+        start = min(brackets)
+    end = max(content.rfind("}"), content.rfind("]")) + 1
+    try:
+        return orjson.loads(content[start:end] if end > start else content[start:])
+    except orjson.JSONDecodeError:
+        # Extra brackets after the JSON (e.g. in trailing prose) - raw_decode stops at the end
+        # of the first JSON value, so anything after it is ignored
+        value, _ = _json_decoder.raw_decode(content, start)
+        return value
+
+
+_ITEM_NAME_RE = re.compile(r'"item_name"\s*:\s*("(?:[^"\\]|\\.)*")')
+_KEYWORDS_RE = re.compile(r'"keywords"\s*:\s*(\[[^\]]*\])')
+
+
+def extract_search_terms(partial: str) -> Optional[tuple[str, list[str]]]:
+    """(item_name, keywords) from a partially streamed identification, once both fields are complete"""
+    name_match = _ITEM_NAME_RE.search(partial)
+    keywords_match = _KEYWORDS_RE.search(partial)
+    if not name_match or not keywords_match:
+        return None
+    try:
+        item_name = orjson.loads(name_match.group(1))
+        keywords = orjson.loads(keywords_match.group(1))
+    except orjson.JSONDecodeError:
         return None
+    if not isinstance(keywords, list) or not all(isinstance(k, str) for k in keywords):
+        return None
+    return item_name, keywords
+
+
+class StreamingArrayParser:
+    """
+    Pulls complete objects out of a JSON array while the model is still streaming it.
+    Feed it content deltas; each call returns the array elements that finished in that delta.
+    """
+    
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._item_start = None
     
+    def feed(self, chunk: str) -> list:
+        self.buffer += chunk
+        buf = self.buffer
+        items = []
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "[" or ch == "{":
+                self._depth += 1
+                if ch == "{" and self._depth == 2:
+                    self._item_start = i
+            elif ch == "]" or ch == "}":
+                if ch == "}" and self._depth == 2 and self._item_start is not None:
+                    try:
+                        items.append(orjson.loads(buf[self._item_start:i + 1]))
+                    except orjson.JSONDecodeError:
+                        pass
+                    self._item_start = None
+                self._depth -= 1
+        self._pos = len(buf)
+        return items
+
+
+def ebay_query_for_item(keywords: list[str], item_name: str) -> str:
+    """eBay search query for an identified item"""
     # Build search query from keywords and item name
     # Use most specific terms first
     search_terms = [item_name] + keywords[:3]
-    query = " ".join(search_terms[:4])  # Limit to avoid over-specific searches
+    return " ".join(search_terms[:4])  # Limit to avoid over-specific searches
+
+
+async def search_ebay_for_item(keywords: list[str], item_name: str) -> Optional[EbayMarketData]:
+    """Search eBay for completed sales of similar items"""
+    if not ebay_client.is_configured:
+        return None
     
+    query = ebay_query_for_item(keywords, item_name)
+    
+    searches = [ebay_client.find_completed_items(query=query, limit=15, sold_only=True)]
+    if len(keywords) > 1:
+        # Run the broader fallback search alongside the specific one rather than after it
+        broader_query = " ".join(keywords[:2])
+        searches.append(ebay_client.find_completed_items(query=broader_query, limit=15, sold_only=True))
+    
+    results = await asyncio.gather(*searches, return_exceptions=True)
+    for result in results:
+        if isinstance(result, asyncio.CancelledError):
+            raise result  # Shutting down - don't mistake it for a failed search
+        if isinstance(result, Exception):
+            # Log but don't fail - eBay data is supplementary
+            logger.warning("eBay search error", exc_info=result)
+    usable = [result for result in results if not isinstance(result, Exception)]
+    if not usable:
+        return None
+    
+    # Prefer the specific search; use the broader one if it came back with too few results (or failed)
+    specific = usable[0]
+    if specific.total_found < 3 and len(usable) > 1:
+        return usable[1]
+    return specific
+
+
+async def prefetch_ebay_from_context(context: str) -> Optional[EbayMarketData]:
+    """Speculative eBay search using the seller's notes, run while the vision call is in flight"""
     try:
-        market_data = await ebay_client.find_completed_items(
-            query=query,
+        return await ebay_client.find_completed_items(
+            query=context,
             limit=15,
             sold_only=True
         )
-        
-        # If too few results, try a broader search
-        if market_data.total_found < 3 and len(keywords) > 1:
-            broader_query = " ".join(keywords[:2])
-            market_data = await ebay_client.find_completed_items(
-                query=broader_query,
-                limit=15,
-                sold_only=True
-            )
-        
-        return market_data
-    except Exception as e:
-        # Log but don't fail - eBay data is supplementary
-        print(f"eBay search error: {e}")
+    except Exception:
+        # Prefetch is best-effort - the regular search still runs if this fails
+        logger.warning("eBay prefetch error", exc_info=True)
         return None
 
 
+# Words that say nothing about which item a query is for
+GENERIC_QUERY_TERMS = frozenset({
+    "a", "an", "and", "as", "at", "by", "for", "from", "in", "is", "it", "of", "on", "or", "the", "to", "with",
+    "antique", "vintage", "old", "item", "piece", "set", "style", "rare", "original", "estate", "collectible",
+})
+
+
+def significant_terms(text: str) -> set[str]:
+    """Lowercased words of a query, without stopwords and generic antique-listing words"""
+    return set(re.findall(r"[a-z0-9]+", text.lower())) - GENERIC_QUERY_TERMS
+
+
+def prefetch_matches_item(market_data: EbayMarketData, keywords: list[str], item_name: str) -> bool:
+    """Check that a prefetched search has enough comparables and covers most of the identified item's search terms"""
+    if len(market_data.items) < 3:
+        return False
+    item_terms = significant_terms(ebay_query_for_item(keywords, item_name))
+    if not item_terms:
+        return False
+    shared = item_terms & significant_terms(market_data.query)
+    return len(shared) * 2 > len(item_terms)
+
+
 async def refine_estimate_with_market_data(
     ai_result: dict,
     market_data: EbayMarketData
@@ -153,12 +504,9 @@ async def refine_estimate_with_market_data(
     """Use market data to refine AI's price estimate"""
     
     # Format comparables for the prompt
-    comparables_text = ""
-    for item in market_data.items[:5]:
-        comparables_text += f"- \"{item.title}\" - ${item.price:.2f} ({item.condition})\n"
-    
-    if not comparables_text:
-        comparables_text = "No specific comparables found"
+    comparables_text = "\n".join(
+        f"- \"{item.title}\" - ${item.price:.2f} ({item.condition})" for item in market_data.items[:5]
+    ) or "No specific comparables found"
     
     prompt = REFINE_PROMPT.format(
         item_name=ai_result["item_name"],
@@ -171,47 +519,162 @@ async def refine_estimate_with_market_data(
         comparables=comparables_text
     )
     
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {settings.openai_api_key}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "gpt-4.1-mini",
-                "messages": [
-                    {"role": "system", "content": "You are an antique pricing expert. Respond only in valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": 500
-            }
-        )
-        
+    async with send_openai(
+        {
+            "model": "gpt-4.1-mini",
+            "messages": [
+                REFINE_SYSTEM_MESSAGE,
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": 500,
+            "response_format": REFINE_RESPONSE_FORMAT
+        },
+        timeout=60.0
+    ) as response:
         if response.status_code != 200:
             return ai_result  # Fall back to original estimate
         
-        result = response.json()
-        content = result["choices"][0]["message"]["content"]
-        
-        # Parse JSON
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0]
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0]
-        
-        refined = json.loads(content.strip())
-        
-        # Update the original result with refined estimates
-        ai_result["estimated_value_low"] = refined.get("estimated_value_low", ai_result["estimated_value_low"])
-        ai_result["estimated_value_high"] = refined.get("estimated_value_high", ai_result["estimated_value_high"])
-        ai_result["suggested_price"] = refined.get("suggested_price", ai_result["suggested_price"])
-        
-        # Add market analysis to selling tips
-        if refined.get("market_analysis"):
-            ai_result["selling_tips"] += f"\n\n📊 Market Analysis: {refined['market_analysis']}"
-        
+        result = orjson.loads(response.content)
+    content = result["choices"][0]["message"].get("content")
+    
+    try:
+        refined = RefinedEstimate.model_validate_json(content or "")
+    except ValidationError:
+        # Refusal or truncated reply - keep the original estimate
+        logger.warning("Unusable price refinement reply: %r", content)
         return ai_result
+    
+    # Update the original result with refined estimates
+    ai_result["estimated_value_low"] = refined.estimated_value_low
+    ai_result["estimated_value_high"] = refined.estimated_value_high
+    ai_result["suggested_price"] = refined.suggested_price
+    
+    # Add market analysis to selling tips
+    if refined.market_analysis:
+        ai_result["selling_tips"] = ai_result.get("selling_tips", "") + f"\n\n📊 Market Analysis: {refined.market_analysis}"
+    
+    return ai_result
+
+
+# Antique store prices run 1.5-2.5x eBay sold prices (same rule the refine prompt gives the model)
+MARKET_MARKUP_LOW = 1.5
+MARKET_MARKUP = 2.0
+MARKET_MARKUP_HIGH = 2.5
+# Share of the final price that comes from eBay; the rest is the AI's own estimate
+MARKET_WEIGHT = 0.7
+# With refine_with_llm, only pay for the AI call when its price is more than this factor away from the markup price
+REFINE_DIVERGENCE = 2.0
+# eBay max/min ratio above which the comps are too mixed for the LLM to improve on a confident AI estimate
+REFINE_MAX_SPREAD = 10.0
+
+
+def needs_ai_refinement(ai_result: dict, market_data: EbayMarketData) -> bool:
+    """True when the AI's initial price disagrees with eBay enough that the markup rule isn't trustworthy"""
+    if ai_result.get("confidence") == "low":
+        return True
+    if ai_result.get("confidence") == "high" and market_data.max_price / max(market_data.min_price, 1) > REFINE_MAX_SPREAD:
+        return False
+    try:
+        suggested = float(ai_result.get("suggested_price") or 0)
+    except (TypeError, ValueError):
+        return True
+    if market_data.median_price <= 0 or suggested <= 0:
+        return True
+    ratio = suggested / (market_data.median_price * MARKET_MARKUP)
+    return ratio > REFINE_DIVERGENCE or ratio < 1 / REFINE_DIVERGENCE
+
+
+def blend_with_estimate(market_price: float, ai_price) -> float:
+    """Weighted mix of the eBay-based price and the AI's estimate (eBay alone if the AI gave no usable number)"""
+    try:
+        ai_price = float(ai_price or 0)
+    except (TypeError, ValueError):
+        ai_price = 0
+    if ai_price <= 0:
+        return market_price
+    return MARKET_WEIGHT * market_price + (1 - MARKET_WEIGHT) * ai_price
+
+
+def estimate_from_market_data(ai_result: dict, market_data: EbayMarketData) -> dict:
+    """Price the item from eBay sales using the store markup rule, without another AI call"""
+    median = market_data.median_price
+    if median <= 0:
+        return ai_result
+    
+    low = blend_with_estimate(max(market_data.min_price, median * 0.7) * MARKET_MARKUP_LOW, ai_result.get("estimated_value_low"))
+    high = blend_with_estimate(market_data.max_price * MARKET_MARKUP_HIGH, ai_result.get("estimated_value_high"))
+    suggested = blend_with_estimate(median * MARKET_MARKUP, ai_result.get("suggested_price"))
+    low, high = min(low, high), max(low, high)
+    
+    ai_result["estimated_value_low"] = round(low, 2)
+    ai_result["estimated_value_high"] = round(high, 2)
+    ai_result["suggested_price"] = round(min(max(suggested, low), high), 2)
+    ai_result["selling_tips"] = ai_result.get("selling_tips", "") + (
+        f"\n\n📊 Market Analysis: Based on {market_data.total_found} eBay sales with median ${median:.2f}, "
+        f"priced at about {MARKET_MARKUP:g}x median."
+    )
+    return ai_result
+
+
+# Parsed vision results keyed by image + seller notes. Market data is not cached here
+# because it goes stale much faster than the identification itself.
+IDENTIFICATION_CACHE_TTL = 7 * 24 * 3600
+identification_cache = TTLCache(maxsize=1024, ttl=IDENTIFICATION_CACHE_TTL)
+# Identifications currently running, so a double-tapped identify shares one vision call
+_inflight_identifications: dict[tuple, asyncio.Future] = {}
+
+
+def identification_cache_key(request: IdentifyRequest) -> str:
+    """SHA-256 of the image (base64 payload or URL), the vision detail level and the seller's notes"""
+    _, image = split_data_url(request.image)
+    digest = hashlib.sha256(image.encode())
+    digest.update(b"\0")
+    digest.update(request.detail.encode())
+    digest.update(b"\0")
+    digest.update((request.additional_context or "").encode())
+    return digest.hexdigest()
+
+
+async def apply_market_data(
+    ai_result: dict,
+    market_data: Optional[EbayMarketData],
+    refine_with_llm: bool = False
+) -> tuple[dict, Optional[MarketDataResponse]]:
+    """Refine the AI estimate with eBay sales and build the market data section of the response"""
+    if not market_data or market_data.total_found == 0:
+        return ai_result, None
+    
+    # Built first - it doesn't depend on the refined prices, so nothing is left to do once the LLM replies.
+    # Every field comes from our own eBay parsing with the right types already, so skip validation.
+    market_response = MarketDataResponse.model_construct(
+        source="eBay Completed Sales",
+        query=market_data.query,
+        total_found=int(market_data.total_found),
+        avg_price=market_data.avg_price,
+        min_price=market_data.min_price,
+        max_price=market_data.max_price,
+        median_price=market_data.median_price,
+        comparables=[
+            EbayComparable.model_construct(
+                title=item.title,
+                price=item.price,
+                condition=item.condition,
+                url=item.item_url
+            )
+            for item in market_data.items[:5]
+        ]
+    )
+    
+    # Prices come from the markup rule; the AI refinement call is opt-in, and only used when the AI's price is way off
+    if refine_with_llm and needs_ai_refinement(ai_result, market_data):
+        logger.info("Pricing %r with LLM refinement", ai_result.get("item_name"))
+        ai_result = await refine_estimate_with_market_data(ai_result, market_data)
+    else:
+        if refine_with_llm:
+            logger.info("Pricing %r with markup rule, LLM refinement skipped", ai_result.get("item_name"))
+        ai_result = estimate_from_market_data(ai_result, market_data)
+    
+    return ai_result, market_response
 
 
 @router.get("/status")
@@ -232,52 +695,52 @@ async def ai_status():
     }
 
 
-@router.post("/identify", response_model=IdentifyResponse)
-async def identify_item(request: IdentifyRequest):
-    """Identify an antique item from an image and get value estimate with eBay market data"""
-    
-    if not settings.openai_api_key:
-        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
-    
+async def identify_with_vision(
+    request: IdentifyRequest,
+    on_search_terms: Optional[Callable[[str, list[str]], None]] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
+    quick: bool = False
+) -> dict:
+    """
+    Step 1 of /identify: ask the vision model what the item is and what it's worth.
+    The answer is streamed: on_delta gets each text chunk, and on_search_terms is called once
+    with (item_name, keywords) as soon as both have been generated.
+    quick=True asks only for the /quick-value fields.
+    """
     # Prepare the image for the API
-    if request.image.startswith("data:image"):
-        image_content = request.image
-    elif request.image.startswith("http"):
-        image_content = request.image
-    else:
-        image_content = f"data:image/jpeg;base64,{request.image}"
+    image_content, detail = await asyncio.to_thread(prepare_image, request.image, request.detail)
     
     # Build the prompt
     user_message = "Please identify this item and provide a value estimate for resale in an antique store."
     if request.additional_context:
         user_message += f"\n\nAdditional context from the seller: {request.additional_context}"
     
-    # Step 1: Initial AI identification
-    async with httpx.AsyncClient(timeout=90.0) as client:
-        try:
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {settings.openai_api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "gpt-4.1",
-                    "messages": [
-                        {"role": "system", "content": SYSTEM_PROMPT},
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": user_message},
-                                {"type": "image_url", "image_url": {"url": image_content, "detail": "high"}}
-                            ]
-                        }
-                    ],
-                    "max_tokens": 2000
-                }
-            )
-            
+    chunks = []
+    need_search_terms = on_search_terms is not None
+    try:
+        async with send_openai(
+            {
+                "model": "gpt-4.1",
+                "messages": [
+                    QUICK_VALUE_SYSTEM_MESSAGE if quick else SYSTEM_MESSAGE,
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": user_message},
+                            {"type": "image_url", "image_url": {"url": image_content, "detail": detail}}
+                        ]
+                    }
+                ],
+                "max_tokens": QUICK_VALUE_MAX_TOKENS if quick else 2000,
+                # JSON mode: no markdown fences or prose around the object
+                "response_format": {"type": "json_object"},
+                "stream": True
+            },
+            timeout=90.0,
+            stream=True
+        ) as response:
             if response.status_code != 200:
+                await response.aread()
                 error_body = response.text
                 try:
                     error_json = response.json()
@@ -286,86 +749,354 @@ async def identify_item(request: IdentifyRequest):
                     error_msg = error_body
                 raise HTTPException(status_code=response.status_code, detail=f"OpenAI API error: {error_msg}")
             
-        except httpx.TimeoutException:
-            raise HTTPException(status_code=504, detail="OpenAI API request timed out")
-        except httpx.RequestError as e:
-            raise HTTPException(status_code=500, detail=f"Network error: {str(e)}")
-        except HTTPException:
-            raise
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+            async for delta in iter_stream_content(response):
+                chunks.append(delta)
+                if on_delta:
+                    on_delta(delta)
+                # The keyword list is the second field, so its closing bracket means both terms are in
+                if need_search_terms and "]" in delta:
+                    search_terms = extract_search_terms("".join(chunks))
+                    if search_terms:
+                        need_search_terms = False
+                        on_search_terms(*search_terms)
+        
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail="OpenAI API request timed out")
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=500, detail=f"Network error: {str(e)}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
     
     # Parse AI response
     try:
-        result = response.json()
-        content = result["choices"][0]["message"]["content"]
-        
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0]
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0]
-        
-        ai_result = json.loads(content.strip())
+        ai_result = parse_ai_json("".join(chunks))
         
     except json.JSONDecodeError as e:
         raise HTTPException(status_code=500, detail=f"Failed to parse AI response: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing response: {str(e)}")
     
-    # Step 2: Search eBay for market data
-    market_data = None
-    market_response = None
+    return ai_result
+
+
+async def identify_and_price(
+    request: IdentifyRequest,
+    on_delta: Optional[Callable[[str], None]] = None,
+    quick: bool = False
+) -> tuple[dict, Optional[MarketDataResponse]]:
+    """The /identify pipeline: vision identification, eBay search, then price refinement"""
     
-    if ebay_client.is_configured:
-        market_data = await search_ebay_for_item(
-            keywords=ai_result.get("keywords", []),
-            item_name=ai_result.get("item_name", "")
-        )
+    # Step 1: Initial AI identification (reused when the same image + notes were seen recently)
+    cache_key = identification_cache_key(request)
+    cached = identification_cache.get(cache_key)
+    if quick:
+        # A full identification has every field a quick one does
+        cache_key = "quick:" + cache_key
+        if cached is None:
+            cached = identification_cache.get(cache_key)
+    prefetch_task = None
+    early_searches: dict[tuple, asyncio.Task] = {}
+    
+    if cached is not None:
+        ai_result = dict(cached)
+    else:
+        # Kick off an eBay search from the seller's notes so it overlaps with the vision call
+        if request.additional_context and ebay_client.is_configured:
+            prefetch_task = asyncio.create_task(prefetch_ebay_from_context(request.additional_context))
         
-        if market_data and market_data.total_found > 0:
-            # Step 3: Refine estimate with market data
-            ai_result = await refine_estimate_with_market_data(ai_result, market_data)
-            
-            # Build market data response
-            market_response = MarketDataResponse(
-                source="eBay Completed Sales",
-                query=market_data.query,
-                total_found=market_data.total_found,
-                avg_price=market_data.avg_price,
-                min_price=market_data.min_price,
-                max_price=market_data.max_price,
-                median_price=market_data.median_price,
-                comparables=[
-                    EbayComparable(
-                        title=item.title,
-                        price=item.price,
-                        condition=item.condition,
-                        url=item.item_url
-                    )
-                    for item in market_data.items[:5]
-                ]
+        def start_item_search(item_name: str, keywords: list[str]):
+            """Start the item's eBay search while the model is still writing the rest of its answer"""
+            if ebay_client.is_configured:
+                early_searches[(item_name, tuple(keywords))] = asyncio.create_task(
+                    search_ebay_for_item(keywords=keywords, item_name=item_name)
+                )
+        
+        try:
+            ai_result = await identify_with_vision(
+                request,
+                on_search_terms=start_item_search,
+                on_delta=on_delta,
+                quick=quick
             )
+        except BaseException:
+            for task in (prefetch_task, *early_searches.values()):
+                if task:
+                    task.cancel()
+            raise
+        # Only cache replies that validate - a bad one would otherwise be served for every retry of the photo
+        try:
+            validated = (QuickValueResult if quick else IdentifyResponse).model_validate(ai_result)
+        except ValidationError:
+            logger.warning("Not caching identification that failed validation: %r", ai_result)
+        else:
+            ai_result = validated.model_dump(mode="json", exclude={"market_data"})
+            identification_cache.set(cache_key, dict(ai_result))
+    
+    # Step 2: Search eBay for market data
+    market_data = None
+    keywords = ai_result.get("keywords", [])
+    item_name = ai_result.get("item_name", "")
+    # Only reuse the early search if the final answer kept the same name and keywords
+    item_search = early_searches.pop((item_name, tuple(keywords)), None)
+    for task in early_searches.values():
+        task.cancel()
+    if item_search is None:
+        item_search = search_ebay_for_item(keywords=keywords, item_name=item_name)
+    
+    if prefetch_task and prefetch_task.done():
+        # Reuse the prefetched search if it matches the identified item
+        prefetched = prefetch_task.result()
+        if prefetched and prefetch_matches_item(prefetched, keywords=keywords, item_name=item_name):
+            market_data = prefetched
     
+    if ebay_client.is_configured and market_data is None:
+        if prefetch_task and not prefetch_task.done():
+            # Prefetch still running - let it race the item search and keep it only if the item search comes back thin
+            market_data, prefetched = await asyncio.gather(item_search, prefetch_task)
+            if (
+                prefetched
+                and (market_data is None or market_data.total_found < 3 <= prefetched.total_found)
+                and prefetch_matches_item(prefetched, keywords=keywords, item_name=item_name)
+            ):
+                market_data = prefetched
+        else:
+            market_data = await item_search
+    elif isinstance(item_search, asyncio.Task):
+        item_search.cancel()
+    else:
+        item_search.close()  # Never awaited
+    
+    # Step 3: Refine estimate with market data
+    return await apply_market_data(ai_result, market_data, refine_with_llm=request.refine_with_llm)
+
+
+async def shared_identify_and_price(
+    request: IdentifyRequest,
+    quick: bool = False
+) -> tuple[dict, Optional[MarketDataResponse]]:
+    """identify_and_price, joining an identical request that is already in flight"""
+    key = (identification_cache_key(request), request.refine_with_llm, quick)
+    task = _inflight_identifications.get(key)
+    if task is None:
+        task = asyncio.ensure_future(identify_and_price(request, quick=quick))
+        _inflight_identifications[key] = task
+        task.add_done_callback(lambda t: _inflight_identifications.pop(key, None))
+    # shield: one caller disconnecting shouldn't cancel the identification for the others
+    ai_result, market_response = await asyncio.shield(task)
+    return dict(ai_result), market_response
+
+
+async def run_identification(
+    request: IdentifyRequest,
+    on_delta: Optional[Callable[[str], None]] = None
+) -> IdentifyResponse:
+    """Full identification with market data, as returned by /identify"""
+    if on_delta is None:
+        ai_result, market_response = await shared_identify_and_price(request)
+    else:
+        # Streaming callers need their own deltas, so they don't join other requests
+        ai_result, market_response = await identify_and_price(request, on_delta=on_delta)
     return IdentifyResponse(
         **ai_result,
         market_data=market_response
     )
 
 
+@router.post("/identify", response_model=IdentifyResponse)
+async def identify_item(request: IdentifyRequest):
+    """Identify an antique item from an image and get value estimate with eBay market data"""
+    
+    if not settings.openai_api_key:
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    
+    return model_response(await run_identification(request))
+
+
+@router.post("/identify/stream")
+async def identify_item_stream(request: IdentifyRequest):
+    """
+    Streaming version of /identify (Server-Sent Events).
+    Sends `delta` events with the model's raw text as it's generated, then a `result` event
+    with the same payload /identify returns (or an `error` event).
+    """
+    
+    if not settings.openai_api_key:
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    
+    async def events():
+        deltas: asyncio.Queue = asyncio.Queue()
+        task = asyncio.create_task(run_identification(request, on_delta=deltas.put_nowait))
+        task.add_done_callback(lambda _: deltas.put_nowait(None))
+        try:
+            while (delta := await deltas.get()) is not None:
+                yield sse_event("delta", orjson.dumps(delta).decode())
+            
+            try:
+                result = task.result()
+            except HTTPException as e:
+                yield sse_event("error", orjson.dumps({"status_code": e.status_code, "detail": e.detail}).decode())
+                return
+            except Exception as e:
+                yield sse_event("error", orjson.dumps({"status_code": 500, "detail": str(e)}).decode())
+                return
+            yield sse_event("result", result.model_dump_json())
+        finally:
+            # Client disconnected - stop the pipeline
+            task.cancel()
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
 @router.post("/quick-value")
 async def quick_value(request: IdentifyRequest):
     """Get a quick value estimate without full identification"""
-    result = await identify_item(request)
+    
+    if not settings.openai_api_key:
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    
+    ai_result, market_response = await shared_identify_and_price(request, quick=True)
     return {
-        "item_name": result.item_name,
-        "estimated_value_low": result.estimated_value_low,
-        "estimated_value_high": result.estimated_value_high,
-        "suggested_price": result.suggested_price,
-        "category": result.category,
-        "market_data": result.market_data
+        "item_name": ai_result.get("item_name", "Unknown"),
+        "estimated_value_low": ai_result.get("estimated_value_low", 0),
+        "estimated_value_high": ai_result.get("estimated_value_high", 0),
+        "suggested_price": ai_result.get("suggested_price", 0),
+        "category": normalize_category(ai_result.get("category")),
+        "market_data": market_response
     }
 
 
+class IdentifyBatchRequest(BaseModel):
+    items: list[IdentifyRequest]
+
+
+# Images packed into a single vision request for /identify-batch
+MAX_BATCH_ITEMS = 10
+# Parallel single-image calls when the packed request can't be used
+BATCH_FALLBACK_CONCURRENCY = 5
+
+BATCH_PROMPT_SUFFIX = """
+
+You will be shown {count} images, each preceded by a label like "Image 1".
+Identify each image separately and respond with a JSON array containing exactly {count} objects
+(one per image, in the same order), each using the fields above."""
+# One system message per batch size, built once at import (requests are capped at MAX_BATCH_ITEMS)
+BATCH_SYSTEM_MESSAGES = {
+    count: {"role": "system", "content": SYSTEM_PROMPT + BATCH_PROMPT_SUFFIX.format(count=count)}
+    for count in range(1, MAX_BATCH_ITEMS + 1)
+}
+
+
+def validated_batch_result(result) -> Optional[dict]:
+    """One entry of a batch reply checked against IdentifyResponse, or None if it's unusable"""
+    try:
+        return IdentifyResponse.model_validate(result).model_dump(exclude={"market_data"})
+    except ValidationError:
+        logger.warning("Unusable batch identification entry: %r", result)
+        return None
+
+
+async def identify_batch_single_call(items: list[IdentifyRequest]) -> Optional[list[Optional[dict]]]:
+    """
+    Identify several images with one vision request. Returns None if the response can't be used,
+    and None in place of any entry that is missing fields or has the wrong types.
+    """
+    content = [{"type": "text", "text": "Please identify each of these items and provide value estimates for resale in an antique store."}]
+    images = await asyncio.gather(*[asyncio.to_thread(prepare_image, item.image, item.detail) for item in items])
+    for i, (item, (image_url, detail)) in enumerate(zip(items, images), start=1):
+        label = f"Image {i}"
+        if item.additional_context:
+            label += f" - additional context from the seller: {item.additional_context}"
+        content.append({"type": "text", "text": label})
+        content.append({"type": "image_url", "image_url": {"url": image_url, "detail": detail}})
+    
+    try:
+        async with send_openai(
+            {
+                "model": "gpt-4.1",
+                "messages": [
+                    BATCH_SYSTEM_MESSAGES[len(items)],
+                    {"role": "user", "content": content}
+                ],
+                "max_tokens": 1500 * len(items)
+            },
+            timeout=120.0
+        ) as response:
+            if response.status_code != 200:
+                return None
+            
+            content = orjson.loads(response.content)["choices"][0]["message"]["content"]
+        results = parse_ai_json(content)
+    except Exception:
+        logger.warning("Batch identification error", exc_info=True)
+        return None
+    
+    if not isinstance(results, list) or len(results) != len(items):
+        return None
+    return [validated_batch_result(r) for r in results]
+
+
+async def add_market_data_to_result(
+    ai_result: dict,
+    refine_with_llm: bool = False,
+    market_data: Optional[EbayMarketData] = None
+) -> IdentifyResponse:
+    """Run the eBay search + refinement steps for one identified item, unless `market_data` already has enough sales"""
+    if market_data is not None and market_data.total_found < 3:
+        market_data = None
+    if market_data is None and ebay_client.is_configured:
+        market_data = await search_ebay_for_item(
+            keywords=ai_result.get("keywords", []),
+            item_name=ai_result.get("item_name", "")
+        )
+    ai_result, market_response = await apply_market_data(ai_result, market_data, refine_with_llm=refine_with_llm)
+    return IdentifyResponse(**ai_result, market_data=market_response)
+
+
+@router.post("/identify-batch", response_model=list[IdentifyResponse])
+async def identify_batch(request: IdentifyBatchRequest):
+    """
+    Identify several items at once.
+    All images go to OpenAI in one request; images that request fails for (or all of them, if it fails outright)
+    are identified separately in parallel.
+    """
+    if not settings.openai_api_key:
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    if not request.items:
+        return []
+    if len(request.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_ITEMS} items per batch")
+    
+    ai_results = await identify_batch_single_call(request.items) or [None] * len(request.items)
+    identified = [i for i, r in enumerate(ai_results) if r is not None]
+    market_data = {}
+    if identified and ebay_client.is_configured:
+        # One combined eBay search for the batch - items it found too few sales for search on their own below
+        try:
+            found = await ebay_client.find_completed_items_batch(
+                [ebay_query_for_item(ai_results[i]["keywords"], ai_results[i]["item_name"]) for i in identified],
+                limit=15,
+                sold_only=True
+            )
+            market_data = dict(zip(identified, found))
+        except Exception:
+            logger.warning("Batch eBay search error", exc_info=True)
+    
+    # Fall back to one identification per image the batch call didn't give a usable result for
+    semaphore = asyncio.Semaphore(BATCH_FALLBACK_CONCURRENCY)
+    
+    async def identify_one(item: IdentifyRequest) -> IdentifyResponse:
+        async with semaphore:
+            return await run_identification(item)
+    
+    return model_response(await asyncio.gather(*[
+        identify_one(item) if r is None
+        else add_market_data_to_result(r, refine_with_llm=item.refine_with_llm, market_data=market_data.get(i))
+        for i, (r, item) in enumerate(zip(ai_results, request.items))
+    ]))
+
+
 @router.get("/ebay-search")
 async def test_ebay_search(q: str):
     """Test endpoint to search eBay directly"""
@@ -403,26 +1134,49 @@ async def test_ebay_search(q: str):
 class ShelfScanRequest(BaseModel):
     image: str  # Base64 encoded image or URL
     max_items: int = 10  # Max items to analyze
+    detail: Literal["low", "high", "auto"] = "auto"  # Vision detail level; "auto" picks from image size
+
+
+DealRating = Literal["🔥 Hot Deal", "✅ Good Find", "⚠️ Maybe", "❌ Skip", "⚠️ Check Manually"]
 
 
 class ShelfItem(BaseModel):
     item_name: str
     description: str
-    category: str
+    category: str  # Free-form - the shelf prompt allows categories outside ItemCategory (toys, decor, ...)
     estimated_shelf_price: float  # What it likely costs at the store
     ebay_low: float
     ebay_high: float
     ebay_avg: float
     profit_potential: float  # Multiplier (ebay_avg / shelf_price)
-    deal_rating: str  # "🔥 Hot Deal", "✅ Good Find", "⚠️ Maybe", "❌ Skip"
+    deal_rating: DealRating
     search_query: str  # The eBay search used
     confidence: str
+    
+    class Config:
+        frozen = True
 
 
 class ShelfScanResponse(BaseModel):
     total_items_found: int
     deals: list[ShelfItem]
     scan_summary: str
+    
+    class Config:
+        frozen = True
+
+
+# Max eBay lookups in flight at once for a single shelf scan (keeps us under eBay rate limits)
+EBAY_LOOKUP_CONCURRENCY = 8
+
+# Deal rating by profit multiplier: below 1.5x, 1.5-3x, 3-5x, 5x and up
+DEAL_RATING_THRESHOLDS = (1.5, 3.0, 5.0)
+DEAL_RATINGS = ("❌ Skip", "⚠️ Maybe", "✅ Good Find", "🔥 Hot Deal")
+
+
+def deal_sort_key(deal: ShelfItem) -> float:
+    """Ascending key that puts the highest profit potential first"""
+    return -deal.profit_potential
 
 
 SHELF_SCAN_PROMPT = """You are an expert antique dealer and thrift store treasure hunter. Analyze this image of a store shelf and identify the TOP 10 most potentially valuable items for resale.
@@ -465,171 +1219,226 @@ Return JSON array with up to 10 items, ordered by likely value (highest first):
 
 If you cannot identify any valuable items, return an empty array []."""
 
+SHELF_SCAN_SYSTEM_MESSAGE = {"role": "system", "content": SHELF_SCAN_PROMPT}
 
-@router.post("/scan-shelf", response_model=ShelfScanResponse)
-async def scan_shelf_for_deals(request: ShelfScanRequest):
-    """
-    AI Deal Finder - Scan a shelf photo to find valuable items worth reselling.
-    Returns top items ranked by profit potential with eBay market data.
-    """
-    
-    if not settings.openai_api_key:
-        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
-    
-    # Prepare the image
-    if request.image.startswith("data:image"):
-        image_content = request.image
-    elif request.image.startswith("http"):
-        image_content = request.image
-    else:
-        image_content = f"data:image/jpeg;base64,{request.image}"
-    
-    # Step 1: Use GPT-4 Vision to identify items
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        try:
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {settings.openai_api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "gpt-4.1",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": SHELF_SCAN_PROMPT
-                        },
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "image_url",
-                                    "image_url": {"url": image_content}
-                                },
-                                {
-                                    "type": "text",
-                                    "text": "Scan this shelf and identify the top valuable items for resale."
-                                }
-                            ]
-                        }
-                    ],
-                    "max_tokens": 2000,
-                    "temperature": 0.3
-                }
-            )
-            
+
+async def stream_shelf_items(image_content: str, detail: str, max_items: int) -> AsyncIterator[dict]:
+    """Step 1: Stream GPT-4 Vision's answer and yield each shelf item as soon as the model finishes describing it"""
+    parser = StreamingArrayParser()
+    found = 0
+    try:
+        async with send_openai(
+            {
+                "model": "gpt-4.1",
+                "messages": [
+                    SHELF_SCAN_SYSTEM_MESSAGE,
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "image_url",
+                                "image_url": {"url": image_content, "detail": detail}
+                            },
+                            {
+                                "type": "text",
+                                "text": "Scan this shelf and identify the top valuable items for resale."
+                            }
+                        ]
+                    }
+                ],
+                "max_tokens": 2000,
+                "temperature": 0.3,
+                "stream": True
+            },
+            timeout=120.0,
+            stream=True
+        ) as response:
             if response.status_code != 200:
+                await response.aread()
                 raise HTTPException(status_code=500, detail=f"OpenAI API error: {response.text}")
             
-            result = response.json()
-            content = result["choices"][0]["message"]["content"]
-            
-        except httpx.TimeoutException:
-            raise HTTPException(status_code=504, detail="AI analysis timed out")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"AI analysis failed: {str(e)}")
-    
-    # Parse the AI response
-    try:
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0]
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0]
+            async for delta in iter_stream_content(response):
+                for item in parser.feed(delta):
+                    if isinstance(item, dict) and found < max_items:
+                        found += 1
+                        yield item
         
-        identified_items = json.loads(content.strip())
-        
-        if not isinstance(identified_items, list):
-            identified_items = []
-            
-    except json.JSONDecodeError:
-        identified_items = []
-    
-    # Step 2: Look up eBay prices for each item
-    deals = []
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail="AI analysis timed out")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"AI analysis failed: {str(e)}")
     
-    for item in identified_items[:request.max_items]:
+    # The streaming parser only understands a bare JSON array - fall back to a full parse otherwise
+    if not found:
         try:
-            # Get eBay market data
-            if ebay_client.is_configured:
+            identified_items = parse_ai_json(parser.buffer)
+        except json.JSONDecodeError:
+            return
+        if isinstance(identified_items, list):
+            for item in identified_items:
+                if isinstance(item, dict) and found < max_items:
+                    found += 1
+                    yield item
+
+
+def build_shelf_item(item: dict, market_data: Optional[EbayMarketData]) -> ShelfItem:
+    """Rate one shelf item against its eBay sales (or a rough estimate when eBay isn't available)"""
+    if market_data is not None:
+        ebay_low = market_data.min_price
+        ebay_high = market_data.max_price
+        ebay_avg = market_data.avg_price
+    else:
+        # Estimate without eBay
+        ebay_low = item.get("estimated_shelf_price", 5) * 2
+        ebay_high = item.get("estimated_shelf_price", 5) * 8
+        ebay_avg = item.get("estimated_shelf_price", 5) * 4
+    
+    shelf_price = item.get("estimated_shelf_price", 5)
+    if shelf_price <= 0:
+        shelf_price = 5
+    
+    profit_potential = ebay_avg / shelf_price if shelf_price > 0 else 0
+    
+    # Rate the deal
+    deal_rating = DEAL_RATINGS[bisect.bisect_right(DEAL_RATING_THRESHOLDS, profit_potential)]
+    
+    # Every field is computed here, so skip re-validating it
+    return ShelfItem.model_construct(
+        item_name=item.get("item_name", "Unknown"),
+        description=item.get("description", ""),
+        category=item.get("category", "other"),
+        estimated_shelf_price=float(shelf_price),
+        ebay_low=float(ebay_low),
+        ebay_high=float(ebay_high),
+        ebay_avg=float(ebay_avg),
+        profit_potential=round(profit_potential, 1),
+        deal_rating=deal_rating,
+        search_query=item.get("search_query", ""),
+        confidence=item.get("confidence", "medium")
+    )
+
+
+async def evaluate_shelf_item(item: dict, semaphore: asyncio.Semaphore) -> ShelfItem:
+    """Step 2: Look up eBay sales for one shelf item and rate it"""
+    try:
+        market_data = None
+        if ebay_client.is_configured:
+            async with semaphore:
                 market_data = await ebay_client.find_completed_items(
                     item.get("search_query", item.get("item_name", "")),
                     limit=10
                 )
-                ebay_low = market_data.min_price
-                ebay_high = market_data.max_price
-                ebay_avg = market_data.avg_price
-            else:
-                # Estimate without eBay
-                ebay_low = item.get("estimated_shelf_price", 5) * 2
-                ebay_high = item.get("estimated_shelf_price", 5) * 8
-                ebay_avg = item.get("estimated_shelf_price", 5) * 4
-            
-            shelf_price = item.get("estimated_shelf_price", 5)
-            if shelf_price <= 0:
-                shelf_price = 5
-            
-            profit_potential = ebay_avg / shelf_price if shelf_price > 0 else 0
-            
-            # Rate the deal
-            if profit_potential >= 5:
-                deal_rating = "🔥 Hot Deal"
-            elif profit_potential >= 3:
-                deal_rating = "✅ Good Find"
-            elif profit_potential >= 1.5:
-                deal_rating = "⚠️ Maybe"
-            else:
-                deal_rating = "❌ Skip"
-            
-            deals.append(ShelfItem(
-                item_name=item.get("item_name", "Unknown"),
-                description=item.get("description", ""),
-                category=item.get("category", "other"),
-                estimated_shelf_price=shelf_price,
-                ebay_low=ebay_low,
-                ebay_high=ebay_high,
-                ebay_avg=ebay_avg,
-                profit_potential=round(profit_potential, 1),
-                deal_rating=deal_rating,
-                search_query=item.get("search_query", ""),
-                confidence=item.get("confidence", "medium")
-            ))
-            
-        except Exception as e:
-            # Still include the item even if eBay lookup fails
-            shelf_price = item.get("estimated_shelf_price", 5)
-            deals.append(ShelfItem(
-                item_name=item.get("item_name", "Unknown"),
-                description=item.get("description", ""),
-                category=item.get("category", "other"),
-                estimated_shelf_price=shelf_price,
-                ebay_low=0,
-                ebay_high=0,
-                ebay_avg=0,
-                profit_potential=0,
-                deal_rating="⚠️ Check Manually",
-                search_query=item.get("search_query", ""),
-                confidence=item.get("confidence", "low")
-            ))
-    
-    # Sort by profit potential (highest first)
-    deals.sort(key=lambda x: x.profit_potential, reverse=True)
-    
-    # Generate summary
+        return build_shelf_item(item, market_data)
+    except Exception:
+        # Still include the item even if eBay lookup fails
+        logger.warning("eBay lookup failed for shelf item %r", item.get("item_name"), exc_info=True)
+        return ShelfItem(
+            item_name=item.get("item_name", "Unknown"),
+            description=item.get("description", ""),
+            category=item.get("category", "other"),
+            estimated_shelf_price=item.get("estimated_shelf_price", 5),
+            ebay_low=0,
+            ebay_high=0,
+            ebay_avg=0,
+            profit_potential=0,
+            deal_rating="⚠️ Check Manually",
+            search_query=item.get("search_query", ""),
+            confidence=item.get("confidence", "low")
+        )
+
+
+def shelf_scan_summary(deals: list[ShelfItem]) -> str:
+    """One-line summary of a shelf scan"""
     hot_deals = sum(1 for d in deals if "Hot" in d.deal_rating)
     good_finds = sum(1 for d in deals if "Good" in d.deal_rating)
     
     if hot_deals > 0:
-        summary = f"🎯 Found {hot_deals} hot deal(s) and {good_finds} good find(s)! Check the top items."
+        return f"🎯 Found {hot_deals} hot deal(s) and {good_finds} good find(s)! Check the top items."
     elif good_finds > 0:
-        summary = f"👍 Found {good_finds} potentially good find(s). Worth investigating!"
+        return f"👍 Found {good_finds} potentially good find(s). Worth investigating!"
     elif deals:
-        summary = "🔍 Some items identified, but nothing stands out. Keep hunting!"
+        return "🔍 Some items identified, but nothing stands out. Keep hunting!"
     else:
-        summary = "📷 Couldn't identify valuable items. Try a clearer photo or different angle."
+        return "📷 Couldn't identify valuable items. Try a clearer photo or different angle."
+
+
+@router.post("/scan-shelf", response_model=ShelfScanResponse)
+async def scan_shelf_for_deals(request: ShelfScanRequest):
+    """
+    AI Deal Finder - Scan a shelf photo to find valuable items worth reselling.
+    Returns top items ranked by profit potential with eBay market data.
+    """
+    
+    if not settings.openai_api_key:
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    
+    # Prepare the image
+    image_content, detail = await asyncio.to_thread(prepare_image, request.image, request.detail)
+    
+    # eBay lookups start while the vision answer is still streaming
+    ebay_semaphore = asyncio.Semaphore(EBAY_LOOKUP_CONCURRENCY)
+    lookup_tasks = []
+    try:
+        async for item in stream_shelf_items(image_content, detail, request.max_items):
+            lookup_tasks.append(asyncio.create_task(evaluate_shelf_item(item, ebay_semaphore)))
+    except HTTPException:
+        for task in lookup_tasks:
+            task.cancel()
+        raise
     
-    return ShelfScanResponse(
+    # Kept ordered by profit potential (highest first) as items are added
+    deals = []
+    for deal in await asyncio.gather(*lookup_tasks):
+        bisect.insort(deals, deal, key=deal_sort_key)
+    
+    return model_response(ShelfScanResponse(
         total_items_found=len(deals),
         deals=deals,
-        scan_summary=summary
-    )
+        scan_summary=shelf_scan_summary(deals)
+    ))
+
+
+@router.post("/scan-shelf-stream")
+async def scan_shelf_stream(request: ShelfScanRequest):
+    """
+    Streaming version of /scan-shelf (Server-Sent Events).
+    Sends a `deal` event as each item's eBay lookup finishes, then a `done` event with the full ranked response.
+    Failures after the stream starts are sent as an `error` event.
+    """
+    
+    if not settings.openai_api_key:
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    
+    image_content, detail = await asyncio.to_thread(prepare_image, request.image, request.detail)
+    
+    async def events():
+        ebay_semaphore = asyncio.Semaphore(EBAY_LOOKUP_CONCURRENCY)
+        lookup_tasks = []
+        try:
+            try:
+                async for item in stream_shelf_items(image_content, detail, request.max_items):
+                    lookup_tasks.append(asyncio.create_task(evaluate_shelf_item(item, ebay_semaphore)))
+            except HTTPException as e:
+                yield sse_event("error", orjson.dumps({"status_code": e.status_code, "detail": e.detail}).decode())
+                return
+            
+            deals = []
+            for next_deal in asyncio.as_completed(lookup_tasks):
+                deal = await next_deal
+                bisect.insort(deals, deal, key=deal_sort_key)
+                yield sse_event("deal", deal.model_dump_json())
+            
+            summary = ShelfScanResponse(
+                total_items_found=len(deals),
+                deals=deals,
+                scan_summary=shelf_scan_summary(deals)
+            )
+            yield sse_event("done", summary.model_dump_json())
+        finally:
+            # Client disconnected or the scan failed - don't leave lookups running
+            for task in lookup_tasks:
+                task.cancel()
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -1,18 +1,143 @@
 """Analytics API - Business intelligence for antique reselling"""
-from fastapi import APIRouter, Depends, Query
+import functools
+import hashlib
+import inspect
+import logging
+import threading
+import orjson
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
+from sqlalchemy import func, extract, case, cast, literal, and_, DateTime, Integer
 from typing import Optional
 from datetime import datetime, timedelta
-from collections import defaultdict
 
+from app.core.cache import TTLCache
 from app.core.database import get_db
 from app.models.item import Item
 from app.models.store import Store
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Results are cached per query-parameter set. Item and store writes clear them (clear_analytics_cache),
+# so the TTLs only bound how stale the time-relative numbers (last N days, inventory age) can get.
+_analytics_caches: list[TTLCache] = []
+# The routes are sync and run in FastAPI's threadpool, and TTLCache isn't thread-safe
+_analytics_cache_lock = threading.Lock()
+# Bumped on every clear, so a result computed before a write is never stored after it
+_analytics_generation = 0
+
+# Cache policies: how long a result is served as-is
+CACHE_SHORT = 60
+CACHE_NORMAL = 600
+CACHE_LONG = 3600
+# Last good result per route, kept through writes and served (marked X-Cache: STALE) if the database errors
+STALE_TTL = 24 * 3600
+
+
+def render_analytics(result) -> tuple[bytes, str]:
+    """Serialize a result once, along with an ETag hashed from the body (weak, since gzip re-encodes the bytes)"""
+    body = orjson.dumps(jsonable_encoder(result), option=orjson.OPT_NON_STR_KEYS)
+    return body, f'W/"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the client's If-None-Match already names this ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in tags or "*" in tags
+
+
+def cached_analytics(ttl: float):
+    """
+    Cache a route's rendered result per query-parameter set for `ttl` seconds, falling back to
+    the last good one on DB errors. Responses carry an ETag, and a matching If-None-Match gets
+    an empty 304 so unchanged numbers aren't re-sent.
+    """
+    def decorator(fn):
+        cache = TTLCache(maxsize=64, ttl=ttl)
+        stale = TTLCache(maxsize=64, ttl=STALE_TTL)
+        _analytics_caches.append(cache)
+        
+        @functools.wraps(fn)
+        def wrapper(*, db: Session, request: Request, **params):
+            key = tuple(sorted(params.items()))
+            with _analytics_cache_lock:
+                rendered = cache.get(key)
+                generation = _analytics_generation
+            headers = {"Cache-Control": "no-cache"}
+            
+            if rendered is None:
+                try:
+                    rendered = render_analytics(fn(db=db, **params))
+                except SQLAlchemyError:
+                    with _analytics_cache_lock:
+                        rendered = stale.get(key)
+                    if rendered is None:
+                        raise
+                    logger.warning("Database error in %s, serving stale analytics", fn.__name__, exc_info=True)
+                    headers["X-Cache"] = "STALE"
+                else:
+                    with _analytics_cache_lock:
+                        if generation == _analytics_generation:
+                            cache.set(key, rendered)
+                        stale.set(key, rendered)
+            
+            body, etag = rendered
+            headers["ETag"] = etag
+            if etag_matches(request, etag):
+                return Response(status_code=304, headers=headers)
+            return Response(content=body, media_type="application/json", headers=headers)
+        
+        # FastAPI reads the route's signature from here - add the request so the wrapper can see If-None-Match
+        signature = inspect.signature(fn)
+        wrapper.__signature__ = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+        ])
+        return wrapper
+    return decorator
+
+
+def clear_analytics_cache():
+    """Drop cached analytics after items or stores change"""
+    global _analytics_generation
+    with _analytics_cache_lock:
+        _analytics_generation += 1
+        for cache in _analytics_caches:
+            cache.clear()
+
+# Profit stats aggregate Item.profit / Item.profit_margin in SQL, which are NULL unless the item sold with a price.
+# The summary's margin is the exception: it also averages in sales recorded at $0 (-100%).
+SALE_MARGIN = case((Item.purchase_price > 0, (Item.sale_price - Item.purchase_price) / Item.purchase_price * 100))
+SOLD_WITH_PRICE = and_(Item.is_sold == True, Item.sale_price != 0)
+
+
+def days_between(db: Session, start, end):
+    """Whole days from start to end - date math differs between Postgres and SQLite"""
+    if db.bind.dialect.name == "postgresql":
+        return func.floor(extract("epoch", end - start) / 86400)
+    return cast(func.julianday(end) - func.julianday(start), Integer)
+
+
+def days_to_sell(db: Session):
+    """Whole days from purchase to sale"""
+    return days_between(db, Item.purchase_date, Item.sale_date)
+
+
+def purchase_weekday(db: Session):
+    """Day of the week an item was bought, 0 = Sunday"""
+    if db.bind.dialect.name == "postgresql":
+        return extract("dow", Item.purchase_date)
+    return func.strftime("%w", Item.purchase_date)
+
 
 @router.get("/summary")
+@cached_analytics(ttl=CACHE_SHORT)
 def get_summary(
     days: int = Query(default=30, description="Number of days to analyze"),
     db: Session = Depends(get_db)
@@ -21,44 +146,33 @@ def get_summary(
     cutoff_date = datetime.utcnow() - timedelta(days=days)
     
     # Total inventory stats
-    total_items = db.query(Item).count()
-    unsold_items = db.query(Item).filter(Item.is_sold == False).count()
-    sold_items = db.query(Item).filter(Item.is_sold == True).count()
+    total_items, unsold_items, sold_items, total_invested = db.query(
+        func.count(Item.id),
+        func.coalesce(func.sum(case((Item.is_sold == False, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Item.is_sold == True, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Item.is_sold == False, Item.purchase_price), else_=0)), 0)
+    ).one()
     
     # Recent sales
-    recent_sold = db.query(Item).filter(
+    recent_sold_count, total_revenue, total_cost, avg_profit_margin, avg_days_to_sell = db.query(
+        func.count(Item.id),
+        func.coalesce(func.sum(func.coalesce(Item.sale_price, 0)), 0),
+        func.coalesce(func.sum(Item.purchase_price), 0),
+        func.avg(SALE_MARGIN),
+        func.avg(days_to_sell(db))
+    ).filter(
         Item.is_sold == True,
         Item.sale_date >= cutoff_date
-    ).all()
+    ).one()
+    total_profit = total_revenue - total_cost
     
     # Recent purchases
-    recent_purchased = db.query(Item).filter(
+    recent_purchased_count, recent_spent = db.query(
+        func.count(Item.id),
+        func.coalesce(func.sum(Item.purchase_price), 0)
+    ).filter(
         Item.purchase_date >= cutoff_date
-    ).all()
-    
-    # Calculate metrics
-    total_invested = sum(item.purchase_price for item in db.query(Item).filter(Item.is_sold == False).all())
-    total_revenue = sum(item.sale_price or 0 for item in recent_sold)
-    total_cost = sum(item.purchase_price for item in recent_sold)
-    total_profit = total_revenue - total_cost
-    
-    avg_profit_margin = 0
-    if recent_sold:
-        margins = []
-        for item in recent_sold:
-            if item.purchase_price > 0:
-                margins.append(((item.sale_price - item.purchase_price) / item.purchase_price) * 100)
-        if margins:
-            avg_profit_margin = sum(margins) / len(margins)
-    
-    avg_days_to_sell = 0
-    if recent_sold:
-        days_list = []
-        for item in recent_sold:
-            if item.sale_date and item.purchase_date:
-                days_list.append((item.sale_date - item.purchase_date).days)
-        if days_list:
-            avg_days_to_sell = sum(days_list) / len(days_list)
+    ).one()
     
     return {
         "period_days": days,
@@ -67,51 +181,47 @@ def get_summary(
         "sold_items": sold_items,
         "current_inventory_value": round(total_invested, 2),
         "recent_sales": {
-            "count": len(recent_sold),
+            "count": recent_sold_count,
             "revenue": round(total_revenue, 2),
             "cost": round(total_cost, 2),
             "profit": round(total_profit, 2),
-            "avg_profit_margin": round(avg_profit_margin, 1),
-            "avg_days_to_sell": round(avg_days_to_sell, 1)
+            "avg_profit_margin": round(avg_profit_margin or 0, 1),
+            "avg_days_to_sell": round(float(avg_days_to_sell or 0), 1)
         },
         "recent_purchases": {
-            "count": len(recent_purchased),
-            "total_spent": round(sum(i.purchase_price for i in recent_purchased), 2)
+            "count": recent_purchased_count,
+            "total_spent": round(recent_spent, 2)
         }
     }
 
 @router.get("/by-store")
+@cached_analytics(ttl=CACHE_NORMAL)
 def get_stats_by_store(db: Session = Depends(get_db)):
     """Get performance stats grouped by store"""
-    stores = db.query(Store).all()
-    results = []
+    rows = db.query(
+        Store.id,
+        Store.name,
+        Store.city,
+        func.count(Item.id),
+        func.count(case((Item.is_sold == True, 1))),
+        func.coalesce(func.sum(Item.purchase_price), 0),
+        func.coalesce(func.sum(Item.profit), 0),
+        func.avg(Item.profit_margin)
+    ).outerjoin(Item, Item.store_id == Store.id).group_by(Store.id).order_by(Store.id).all()
     
-    for store in stores:
-        items = db.query(Item).filter(Item.store_id == store.id).all()
-        sold = [i for i in items if i.is_sold]
-        unsold = [i for i in items if not i.is_sold]
-        
-        total_profit = sum((i.sale_price - i.purchase_price) for i in sold if i.sale_price)
-        total_invested = sum(i.purchase_price for i in items)
-        
-        avg_margin = 0
-        if sold:
-            margins = [((i.sale_price - i.purchase_price) / i.purchase_price) * 100 
-                      for i in sold if i.purchase_price > 0 and i.sale_price]
-            if margins:
-                avg_margin = sum(margins) / len(margins)
-        
+    results = []
+    for store_id, store_name, city, total_items, sold_items, total_invested, total_profit, avg_margin in rows:
         results.append({
-            "store_id": store.id,
-            "store_name": store.name,
-            "city": store.city,
-            "total_items": len(items),
-            "sold_items": len(sold),
-            "unsold_items": len(unsold),
+            "store_id": store_id,
+            "store_name": store_name,
+            "city": city,
+            "total_items": total_items,
+            "sold_items": sold_items,
+            "unsold_items": total_items - sold_items,
             "total_invested": round(total_invested, 2),
             "total_profit": round(total_profit, 2),
-            "avg_profit_margin": round(avg_margin, 1),
-            "sell_through_rate": round((len(sold) / len(items) * 100) if items else 0, 1)
+            "avg_profit_margin": round(avg_margin or 0, 1),
+            "sell_through_rate": round((sold_items / total_items * 100) if total_items else 0, 1)
         })
     
     # Sort by profit
@@ -119,46 +229,32 @@ def get_stats_by_store(db: Session = Depends(get_db)):
     return results
 
 @router.get("/by-category")
+@cached_analytics(ttl=CACHE_NORMAL)
 def get_stats_by_category(db: Session = Depends(get_db)):
     """Get performance stats grouped by category"""
-    items = db.query(Item).all()
-    categories = defaultdict(list)
-    
-    for item in items:
-        categories[item.category].append(item)
+    is_sold = Item.is_sold == True
+    rows = db.query(
+        Item.category,
+        func.count(Item.id),
+        func.count(case((is_sold, 1))),
+        func.coalesce(func.sum(Item.profit), 0),
+        func.coalesce(func.sum(case((is_sold, Item.sale_price))), 0),
+        func.avg(Item.profit_margin),
+        func.avg(case((is_sold, days_to_sell(db))))
+    ).group_by(Item.category).order_by(func.min(Item.id)).all()
     
     results = []
-    for category, cat_items in categories.items():
-        sold = [i for i in cat_items if i.is_sold]
-        unsold = [i for i in cat_items if not i.is_sold]
-        
-        total_profit = sum((i.sale_price - i.purchase_price) for i in sold if i.sale_price)
-        total_revenue = sum(i.sale_price or 0 for i in sold)
-        
-        avg_margin = 0
-        if sold:
-            margins = [((i.sale_price - i.purchase_price) / i.purchase_price) * 100 
-                      for i in sold if i.purchase_price > 0 and i.sale_price]
-            if margins:
-                avg_margin = sum(margins) / len(margins)
-        
-        avg_days_to_sell = 0
-        if sold:
-            days_list = [(i.sale_date - i.purchase_date).days 
-                        for i in sold if i.sale_date and i.purchase_date]
-            if days_list:
-                avg_days_to_sell = sum(days_list) / len(days_list)
-        
+    for category, total_items, sold_items, total_profit, total_revenue, avg_margin, avg_days_to_sell in rows:
         results.append({
             "category": category,
-            "total_items": len(cat_items),
-            "sold_items": len(sold),
-            "unsold_items": len(unsold),
+            "total_items": total_items,
+            "sold_items": sold_items,
+            "unsold_items": total_items - sold_items,
             "total_profit": round(total_profit, 2),
             "total_revenue": round(total_revenue, 2),
-            "avg_profit_margin": round(avg_margin, 1),
-            "avg_days_to_sell": round(avg_days_to_sell, 1),
-            "sell_through_rate": round((len(sold) / len(cat_items) * 100) if cat_items else 0, 1)
+            "avg_profit_margin": round(avg_margin or 0, 1),
+            "avg_days_to_sell": round(float(avg_days_to_sell or 0), 1),
+            "sell_through_rate": round(sold_items / total_items * 100, 1)
         })
     
     # Sort by profit
@@ -166,32 +262,32 @@ def get_stats_by_category(db: Session = Depends(get_db)):
     return results
 
 @router.get("/best-shopping-days")
+@cached_analytics(ttl=CACHE_LONG)
 def get_best_shopping_days(db: Session = Depends(get_db)):
     """Analyze which days of the week yield the best finds"""
-    items = db.query(Item).filter(Item.is_sold == True).all()
-    
     # Group by day of week purchased
-    days = defaultdict(list)
-    for item in items:
-        if item.purchase_date:
-            day_name = item.purchase_date.strftime("%A")
-            profit = (item.sale_price - item.purchase_price) if item.sale_price else 0
-            days[day_name].append({
-                "profit": profit,
-                "margin": ((item.sale_price - item.purchase_price) / item.purchase_price * 100) if item.purchase_price > 0 and item.sale_price else 0
-            })
+    weekday = purchase_weekday(db)
+    rows = db.query(
+        weekday,
+        func.count(Item.id),
+        func.coalesce(func.sum(Item.profit), 0),
+        # Items without a usable margin count as 0% rather than being left out
+        func.avg(func.coalesce(Item.profit_margin, 0))
+    ).filter(
+        Item.is_sold == True,
+        Item.purchase_date != None
+    ).group_by(weekday).all()
     
-    results = []
     day_order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+    days = {day_order[(int(dow) - 1) % 7]: (count, profit, margin) for dow, count, profit, margin in rows}
     
+    results = []
     for day in day_order:
         if day in days:
-            items_list = days[day]
-            total_profit = sum(i["profit"] for i in items_list)
-            avg_margin = sum(i["margin"] for i in items_list) / len(items_list) if items_list else 0
+            items_purchased, total_profit, avg_margin = days[day]
             results.append({
                 "day": day,
-                "items_purchased": len(items_list),
+                "items_purchased": items_purchased,
                 "total_profit": round(total_profit, 2),
                 "avg_profit_margin": round(avg_margin, 1)
             })
@@ -206,75 +302,97 @@ def get_best_shopping_days(db: Session = Depends(get_db)):
     return results
 
 @router.get("/inventory-aging")
+@cached_analytics(ttl=CACHE_NORMAL)
 def get_inventory_aging(db: Session = Depends(get_db)):
     """Analyze how long items have been in inventory"""
-    unsold = db.query(Item).filter(Item.is_sold == False).all()
     now = datetime.utcnow()
+    days_old = days_between(db, Item.purchase_date, literal(now, DateTime))
     
-    aging_buckets = {
-        "0-30 days": [],
-        "31-60 days": [],
-        "61-90 days": [],
-        "91-180 days": [],
-        "180+ days": []
+    aging_buckets = ["0-30 days", "31-60 days", "61-90 days", "91-180 days", "180+ days"]
+    bucket = case(
+        (days_old <= 30, aging_buckets[0]),
+        (days_old <= 60, aging_buckets[1]),
+        (days_old <= 90, aging_buckets[2]),
+        (days_old <= 180, aging_buckets[3]),
+        else_=aging_buckets[4]
+    )
+    unsold = (Item.is_sold == False, Item.purchase_date != None)
+    
+    totals = {
+        name: (count, value)
+        for name, count, value in db.query(
+            bucket, func.count(Item.id), func.sum(Item.purchase_price)
+        ).filter(*unsold).group_by(bucket).all()
     }
     
-    for item in unsold:
-        if item.purchase_date:
-            days_old = (now - item.purchase_date).days
-            if days_old <= 30:
-                aging_buckets["0-30 days"].append(item)
-            elif days_old <= 60:
-                aging_buckets["31-60 days"].append(item)
-            elif days_old <= 90:
-                aging_buckets["61-90 days"].append(item)
-            elif days_old <= 180:
-                aging_buckets["91-180 days"].append(item)
-            else:
-                aging_buckets["180+ days"].append(item)
+    # First 5 items of each bucket, numbered per bucket by a window function
+    ranked = db.query(
+        bucket.label("bucket"),
+        Item.id,
+        Item.name,
+        Item.purchase_price,
+        func.row_number().over(partition_by=bucket, order_by=Item.id).label("position")
+    ).filter(*unsold).subquery()
+    previews = {name: [] for name in aging_buckets}
+    for name, item_id, item_name, price in db.query(
+        ranked.c.bucket, ranked.c.id, ranked.c.name, ranked.c.purchase_price
+    ).filter(ranked.c.position <= 5).order_by(ranked.c.bucket, ranked.c.position):
+        previews[name].append({"id": item_id, "name": item_name, "price": price})
     
     results = []
-    for bucket, items in aging_buckets.items():
+    for name in aging_buckets:
+        count, value = totals.get(name, (0, 0))
         results.append({
-            "bucket": bucket,
-            "item_count": len(items),
-            "total_value": round(sum(i.purchase_price for i in items), 2),
-            "items": [{"id": i.id, "name": i.name, "price": i.purchase_price} for i in items[:5]]  # Top 5
+            "bucket": name,
+            "item_count": count,
+            "total_value": round(value, 2),
+            "items": previews[name]  # Top 5
         })
     
     return results
 
 @router.get("/top-items")
+@cached_analytics(ttl=CACHE_NORMAL)
 def get_top_items(
     metric: str = Query(default="profit", description="Sort by: profit, margin, or revenue"),
     limit: int = Query(default=10, le=50),
     db: Session = Depends(get_db)
 ):
     """Get top performing items"""
-    sold = db.query(Item).filter(Item.is_sold == True).all()
+    # Sort and limit in SQL so only `limit` rows come back
+    sort_columns = {
+        "profit": Item.profit,
+        "margin": Item.profit_margin,
+        "revenue": Item.sale_price
+    }
+    query = db.query(
+        Item.id,
+        Item.name,
+        Item.category,
+        Item.purchase_price,
+        Item.sale_price,
+        Item.purchase_date,
+        Item.sale_date
+    ).filter(
+        SOLD_WITH_PRICE,
+        Item.purchase_price > 0
+    )
+    if metric in sort_columns:
+        query = query.order_by(sort_columns[metric].desc())
     
     items_with_metrics = []
-    for item in sold:
-        if item.sale_price and item.purchase_price > 0:
-            profit = item.sale_price - item.purchase_price
-            margin = (profit / item.purchase_price) * 100
-            items_with_metrics.append({
-                "id": item.id,
-                "name": item.name,
-                "category": item.category,
-                "purchase_price": item.purchase_price,
-                "sale_price": item.sale_price,
-                "profit": round(profit, 2),
-                "margin": round(margin, 1),
-                "days_to_sell": (item.sale_date - item.purchase_date).days if item.sale_date and item.purchase_date else None
-            })
-    
-    # Sort by metric
-    if metric == "profit":
-        items_with_metrics.sort(key=lambda x: x["profit"], reverse=True)
-    elif metric == "margin":
-        items_with_metrics.sort(key=lambda x: x["margin"], reverse=True)
-    elif metric == "revenue":
-        items_with_metrics.sort(key=lambda x: x["sale_price"], reverse=True)
+    for item in query.order_by(Item.id).limit(limit):
+        profit = item.sale_price - item.purchase_price
+        margin = (profit / item.purchase_price) * 100
+        items_with_metrics.append({
+            "id": item.id,
+            "name": item.name,
+            "category": item.category,
+            "purchase_price": item.purchase_price,
+            "sale_price": item.sale_price,
+            "profit": round(profit, 2),
+            "margin": round(margin, 1),
+            "days_to_sell": (item.sale_date - item.purchase_date).days if item.sale_date and item.purchase_date else None
+        })
     
-    return items_with_metrics[:limit]
+    return items_with_metrics
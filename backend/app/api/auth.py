@@ -3,15 +3,30 @@ from fastapi import APIRouter, HTTPException, Depends, Header
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import hmac
+import time
+import bcrypt
+import orjson
 from jose import jwt, JWTError
 
-from app.core.config import settings
+from app.core.cache import TTLCache
+from app.core.config import JWT_SECRET, ADMIN_EMAIL, ADMIN_PASSWORD
 
 router = APIRouter()
 
-SECRET_KEY = settings.jwt_secret
+SECRET_KEY = JWT_SECRET
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
+# Hashed once at startup so login compares against bcrypt rather than the plain string
+ADMIN_PASSWORD_HASH = bcrypt.hashpw(ADMIN_PASSWORD.encode(), bcrypt.gensalt())
+
+# Verified tokens -> email, so repeat requests skip the HMAC check and JSON decode.
+# Entries never outlive the token's exp, so a cache hit needs no clock check of its own
+_verified_tokens = TTLCache(maxsize=4096, ttl=600)
+# sha256 of the JSON array [email, password] -> whether it matched, so a burst of identical logins pays for one bcrypt check
+_login_results = TTLCache(maxsize=1024, ttl=30)
 
 
 class LoginRequest(BaseModel):
@@ -29,23 +44,44 @@ def create_access_token(email: str) -> str:
     return jwt.encode({"sub": email, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def verify_token(authorization: Optional[str] = Header(None)) -> str:
+async def verify_token(authorization: Optional[str] = Header(None)) -> str:
+    # async so it runs on the event loop: no threadpool hop, and the token cache needs no lock
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Not authenticated")
     token = authorization.split(" ")[1]
+    
+    email = _verified_tokens.get(token)
+    if email is not None:
+        return email
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email = payload.get("sub")
         if email is None:
             raise HTTPException(status_code=401, detail="Invalid token")
+        expires_in = payload.get("exp", float("inf")) - time.time()
+        _verified_tokens.set(token, email, ttl=min(_verified_tokens.ttl, expires_in))
         return email
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
 
+def check_credentials(email: str, password: str) -> bool:
+    """Constant-time email compare plus bcrypt password check (~100ms)"""
+    email_ok = hmac.compare_digest(email.encode(), ADMIN_EMAIL.encode())
+    password_ok = bcrypt.checkpw(password.encode(), ADMIN_PASSWORD_HASH)
+    return email_ok and password_ok
+
+
 @router.post("/login", response_model=TokenResponse)
-def login(request: LoginRequest):
-    if request.email != settings.admin_email or request.password != settings.admin_password:
+async def login(request: LoginRequest):
+    # async so the result cache is only touched on the event loop; bcrypt itself runs in a thread
+    key = hashlib.sha256(orjson.dumps([request.email, request.password])).digest()
+    valid = _login_results.get(key)
+    if valid is None:
+        valid = await asyncio.to_thread(check_credentials, request.email, request.password)
+        _login_results.set(key, valid)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     token = create_access_token(request.email)
     return TokenResponse(access_token=token)
@@ -1,11 +1,14 @@
 """Items API endpoints"""
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
+import orjson
 
+from app.api.analytics import clear_analytics_cache
+from app.api.stores import clear_store_usage_counts
 from app.core.database import get_db
 from app.models.item import Item, ItemCategory, ItemCondition
 
@@ -80,6 +83,32 @@ class ItemResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# List endpoints select just these columns rather than loading Item objects
+ITEM_RESPONSE_COLUMNS = [Item.__table__.c[name] for name in ItemResponse.model_fields if name in Item.__table__.c]
+
+
+def item_row_response(row) -> dict:
+    """ItemResponse-shaped dict for a row of ITEM_RESPONSE_COLUMNS, with the computed fields filled in"""
+    item = dict(row)
+    item["profit"] = item["profit_margin"] = item["days_to_sell"] = None
+    # Same rules as the Item.profit / profit_margin / days_to_sell properties
+    if item["is_sold"] and item["sale_price"]:
+        item["profit"] = item["sale_price"] - item["purchase_price"]
+        if item["purchase_price"] > 0:
+            item["profit_margin"] = (item["profit"] / item["purchase_price"]) * 100
+    if item["is_sold"] and item["sale_date"] and item["purchase_date"]:
+        item["days_to_sell"] = (item["sale_date"] - item["purchase_date"]).days
+    return item
+
+
+def json_response(content) -> Response:
+    """
+    Serialize item rows straight to JSON. They come from our own columns, so returning a Response
+    skips response_model re-validation (the model still documents the schema).
+    OPT_UTC_Z writes UTC datetimes with "Z", as Pydantic does.
+    """
+    return Response(content=orjson.dumps(content, option=orjson.OPT_UTC_Z), media_type="application/json")
+
 # Public endpoint - no auth required
 @router.get("/public", response_model=List[ItemResponse])
 def list_public_items(
@@ -91,7 +120,7 @@ def list_public_items(
     db: Session = Depends(get_db)
 ):
     """Get items listed for public sale (no auth required)"""
-    query = db.query(Item).filter(Item.is_listed == True, Item.is_sold == False)
+    query = db.query(*ITEM_RESPONSE_COLUMNS).filter(Item.is_listed == True, Item.is_sold == False)
     
     if category:
         query = query.filter(Item.category == category)
@@ -100,39 +129,37 @@ def list_public_items(
     if max_price is not None:
         query = query.filter(Item.listed_price <= max_price)
     
-    items = query.order_by(desc(Item.created_at)).offset(offset).limit(limit).all()
-    
-    result = []
-    for item in items:
-        item_dict = ItemResponse.model_validate(item).model_dump()
-        result.append(item_dict)
-    
-    return result
+    rows = query.order_by(desc(Item.created_at), desc(Item.id)).offset(offset).limit(limit).all()
+    return json_response([item_row_response(row._mapping) for row in rows])
+
+
+# Category list endpoint - the list never changes, so it's serialized once at import
+CATEGORIES = [
+    {"value": "furniture", "label": "Furniture"},
+    {"value": "art", "label": "Art & Paintings"},
+    {"value": "vases", "label": "Vases"},
+    {"value": "figurines", "label": "Figurines"},
+    {"value": "knick_knacks", "label": "Knick Knacks"},
+    {"value": "jewelry", "label": "Jewelry"},
+    {"value": "pottery", "label": "Pottery & Ceramics"},
+    {"value": "glassware", "label": "Glassware"},
+    {"value": "textiles", "label": "Textiles & Linens"},
+    {"value": "books", "label": "Books"},
+    {"value": "collectibles", "label": "Collectibles"},
+    {"value": "vintage_decor", "label": "Vintage Decor"},
+    {"value": "kitchenware", "label": "Kitchenware"},
+    {"value": "lighting", "label": "Lighting & Lamps"},
+    {"value": "mirrors", "label": "Mirrors"},
+    {"value": "clocks", "label": "Clocks"},
+    {"value": "other", "label": "Other"},
+]
+_CATEGORIES_JSON = orjson.dumps(CATEGORIES)
 
 
-# Category list endpoint
 @router.get("/categories")
-def list_categories():
+async def list_categories():
     """Get all available categories"""
-    return [
-        {"value": "furniture", "label": "Furniture"},
-        {"value": "art", "label": "Art & Paintings"},
-        {"value": "vases", "label": "Vases"},
-        {"value": "figurines", "label": "Figurines"},
-        {"value": "knick_knacks", "label": "Knick Knacks"},
-        {"value": "jewelry", "label": "Jewelry"},
-        {"value": "pottery", "label": "Pottery & Ceramics"},
-        {"value": "glassware", "label": "Glassware"},
-        {"value": "textiles", "label": "Textiles & Linens"},
-        {"value": "books", "label": "Books"},
-        {"value": "collectibles", "label": "Collectibles"},
-        {"value": "vintage_decor", "label": "Vintage Decor"},
-        {"value": "kitchenware", "label": "Kitchenware"},
-        {"value": "lighting", "label": "Lighting & Lamps"},
-        {"value": "mirrors", "label": "Mirrors"},
-        {"value": "clocks", "label": "Clocks"},
-        {"value": "other", "label": "Other"},
-    ]
+    return Response(content=_CATEGORIES_JSON, media_type="application/json")
 
 @router.get("/", response_model=List[ItemResponse])
 def list_items(
@@ -144,7 +171,7 @@ def list_items(
     db: Session = Depends(get_db)
 ):
     """Get all items with optional filters"""
-    query = db.query(Item)
+    query = db.query(*ITEM_RESPONSE_COLUMNS)
     
     if sold is not None:
         query = query.filter(Item.is_sold == sold)
@@ -153,21 +180,8 @@ def list_items(
     if store_id:
         query = query.filter(Item.store_id == store_id)
     
-    items = query.order_by(desc(Item.created_at)).offset(offset).limit(limit).all()
-    
-    # Add computed fields
-    result = []
-    for item in items:
-        item_dict = ItemResponse.model_validate(item).model_dump()
-        if item.is_sold and item.sale_price:
-            item_dict["profit"] = item.sale_price - item.purchase_price
-            if item.purchase_price > 0:
-                item_dict["profit_margin"] = ((item.sale_price - item.purchase_price) / item.purchase_price) * 100
-            if item.sale_date and item.purchase_date:
-                item_dict["days_to_sell"] = (item.sale_date - item.purchase_date).days
-        result.append(item_dict)
-    
-    return result
+    rows = query.order_by(desc(Item.created_at), desc(Item.id)).offset(offset).limit(limit).all()
+    return json_response([item_row_response(row._mapping) for row in rows])
 
 @router.post("/", response_model=ItemResponse)
 def create_item(item: ItemCreate, db: Session = Depends(get_db)):
@@ -175,16 +189,18 @@ def create_item(item: ItemCreate, db: Session = Depends(get_db)):
     db_item = Item(**item.model_dump())
     db.add(db_item)
     db.commit()
+    clear_analytics_cache()
+    clear_store_usage_counts()
     db.refresh(db_item)
     return db_item
 
 @router.get("/{item_id}", response_model=ItemResponse)
 def get_item(item_id: int, db: Session = Depends(get_db)):
     """Get a specific item"""
-    item = db.query(Item).filter(Item.id == item_id).first()
-    if not item:
+    row = db.query(*ITEM_RESPONSE_COLUMNS).filter(Item.id == item_id).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Item not found")
-    return item
+    return json_response(item_row_response(row._mapping))
 
 @router.patch("/{item_id}", response_model=ItemResponse)
 def update_item(item_id: int, item_update: ItemUpdate, db: Session = Depends(get_db)):
@@ -198,6 +214,8 @@ def update_item(item_id: int, item_update: ItemUpdate, db: Session = Depends(get
         setattr(item, field, value)
     
     db.commit()
+    clear_analytics_cache()
+    clear_store_usage_counts()
     db.refresh(item)
     return item
 
@@ -213,6 +231,7 @@ def mark_item_sold(item_id: int, sale: ItemSale, db: Session = Depends(get_db)):
     item.sale_date = sale.sale_date or datetime.utcnow()
     
     db.commit()
+    clear_analytics_cache()
     db.refresh(item)
     return item
 
@@ -236,4 +255,6 @@ def delete_item(item_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Item not found")
     db.delete(item)
     db.commit()
+    clear_analytics_cache()
+    clear_store_usage_counts()
     return {"message": "Item deleted"}
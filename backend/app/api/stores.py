@@ -1,11 +1,13 @@
 """Store API endpoints"""
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func, insert
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
+import time
 
+from app.api.analytics import clear_analytics_cache
 from app.core.database import get_db
 from app.models.store import Store
 from app.models.item import Item
@@ -95,6 +97,37 @@ BREVARD_STORES = [
 
 # All default stores
 DEFAULT_STORES = ONLINE_MARKETPLACES + BREVARD_STORES
+# Seed rows keyed by lowercase name, with the same keys on every row so they insert as one executemany
+DEFAULT_STORES_BY_NAME = {
+    store_data["name"].lower(): {"address": None, **store_data}
+    for store_data in DEFAULT_STORES
+}
+
+# Items per store for the search typeahead, recounted at most every STORE_USAGE_TTL seconds.
+# Held as one (expires_at, counts) tuple so threadpool requests can swap it without a lock.
+STORE_USAGE_TTL = 30
+_store_usage: tuple[float, dict[int, int]] = (0.0, {})
+
+
+def store_usage_counts(db: Session) -> dict[int, int]:
+    """store_id -> number of items bought there"""
+    global _store_usage
+    expires_at, counts = _store_usage
+    if expires_at <= time.monotonic():
+        counts = dict(
+            db.query(Item.store_id, func.count(Item.id))
+            .filter(Item.store_id != None)
+            .group_by(Item.store_id)
+            .all()
+        )
+        _store_usage = (time.monotonic() + STORE_USAGE_TTL, counts)
+    return counts
+
+
+def clear_store_usage_counts():
+    """Force a recount after items are added, moved or deleted"""
+    global _store_usage
+    _store_usage = (0.0, {})
 
 @router.get("/", response_model=List[StoreResponse])
 def list_stores(db: Session = Depends(get_db)):
@@ -112,28 +145,7 @@ def search_stores(
     Returns stores sorted by usage count (most used first), then alphabetically.
     If no query, returns most used stores.
     """
-    # Subquery to count items per store
-    usage_subquery = (
-        db.query(
-            Item.store_id,
-            func.count(Item.id).label('usage_count')
-        )
-        .group_by(Item.store_id)
-        .subquery()
-    )
-    
-    # Main query with left join to get usage counts
-    query = (
-        db.query(
-            Store.id,
-            Store.name,
-            Store.address,
-            Store.city,
-            Store.notes,
-            func.coalesce(usage_subquery.c.usage_count, 0).label('usage_count')
-        )
-        .outerjoin(usage_subquery, Store.id == usage_subquery.c.store_id)
-    )
+    query = db.query(Store.id, Store.name, Store.address, Store.city, Store.notes)
     
     # Apply search filter if query provided
     if q.strip():
@@ -143,25 +155,11 @@ def search_stores(
             func.lower(Store.city).like(search_term)
         )
     
-    # Order by usage count (desc), then alphabetically
-    results = (
-        query
-        .order_by(desc('usage_count'), Store.name)
-        .limit(limit)
-        .all()
-    )
-    
-    return [
-        StoreWithUsage(
-            id=r.id,
-            name=r.name,
-            address=r.address,
-            city=r.city,
-            notes=r.notes,
-            usage_count=r.usage_count
-        )
-        for r in results
-    ]
+    # Order by usage count (desc), then alphabetically - there are only a few dozen stores
+    usage = store_usage_counts(db)
+    results = [{**r._asdict(), "usage_count": usage.get(r.id, 0)} for r in query.all()]
+    results.sort(key=lambda r: (-r["usage_count"], r["name"]))
+    return results[:limit]
 
 @router.post("/", response_model=StoreResponse)
 def create_store(store: StoreCreate, db: Session = Depends(get_db)):
@@ -169,21 +167,22 @@ def create_store(store: StoreCreate, db: Session = Depends(get_db)):
     db_store = Store(**store.model_dump())
     db.add(db_store)
     db.commit()
+    clear_analytics_cache()
     db.refresh(db_store)
     return db_store
 
 @router.api_route("/seed-brevard", methods=["GET", "POST"])
 def seed_brevard_stores(db: Session = Depends(get_db)):
     """Seed database with default stores (online + Brevard County)"""
-    added = 0
-    for store_data in DEFAULT_STORES:
-        # Check if already exists
-        existing = db.query(Store).filter(Store.name == store_data["name"]).first()
-        if not existing:
-            db_store = Store(**store_data)
-            db.add(db_store)
-            added += 1
+    # One query for the names that already exist (ignoring case), then one batched insert for the rest
+    lower_name = func.lower(Store.name)
+    existing = {name for (name,) in db.query(lower_name).filter(lower_name.in_(DEFAULT_STORES_BY_NAME))}
+    new_stores = [row for name, row in DEFAULT_STORES_BY_NAME.items() if name not in existing]
+    if new_stores:
+        db.execute(insert(Store), new_stores)
+    added = len(new_stores)
     db.commit()
+    clear_analytics_cache()
     return {"message": f"Added {added} stores", "total": len(DEFAULT_STORES)}
 
 @router.get("/{store_id}", response_model=StoreResponse)
@@ -206,6 +205,7 @@ def update_store(store_id: int, store_update: StoreCreate, db: Session = Depends
         setattr(store, field, value)
     
     db.commit()
+    clear_analytics_cache()
     db.refresh(store)
     return store
 
@@ -217,4 +217,5 @@ def delete_store(store_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Store not found")
     db.delete(store)
     db.commit()
+    clear_analytics_cache()
     return {"message": "Store deleted"}
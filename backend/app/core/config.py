@@ -8,6 +8,7 @@ class Settings(BaseSettings):
     
     # OpenAI
     openai_api_key: str = ""
+    openai_max_concurrent: int = 8  # Simultaneous OpenAI requests per process - raise on higher usage tiers
     
     # eBay API (for market price research)
     ebay_app_id: str = ""  # Also called Client ID
@@ -31,3 +32,8 @@ def get_settings():
     return Settings()
 
 settings = get_settings()
+
+# Auth values read on every login/token check, pulled out of the Settings model once
+JWT_SECRET = settings.jwt_secret
+ADMIN_EMAIL = settings.admin_email
+ADMIN_PASSWORD = settings.admin_password
@@ -11,7 +11,14 @@ if settings.database_url.startswith("sqlite"):
         connect_args={"check_same_thread": False}
     )
 else:
-    engine = create_engine(settings.database_url)
+    # Sync routes run in FastAPI's threadpool (40 threads), so allow more than the default 5+10 connections.
+    # pre_ping replaces connections the server dropped while idle instead of failing the request.
+    engine = create_engine(
+        settings.database_url,
+        pool_size=20,
+        max_overflow=10,
+        pool_pre_ping=True
+    )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -1,56 +1,104 @@
 """Antique Tracker API - Main Application"""
+import asyncio
+import logging
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from contextlib import asynccontextmanager
 
-from sqlalchemy import inspect, text
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateIndex
 from app.core.config import settings
 from app.core.database import engine, Base
+from app.core.logging import setup_logging, shutdown_logging
 from app.api import items, stores, analytics, ai_identifier, auth
+from app.services import ebay
+from app.models.item import Item
 
-def auto_migrate():
-    """Add missing columns to existing tables and set defaults."""
-    inspector = inspect(engine)
+logger = logging.getLogger(__name__)
+
+# Server-Sent Event routes - gzip buffers output, which would hold back their progress events
+STREAMING_PATHS = frozenset({"/api/ai/identify/stream", "/api/ai/scan-shelf-stream"})
+
+
+class GZipExceptStreamsMiddleware(GZipMiddleware):
+    """Gzip responses, leaving the streaming routes uncompressed"""
     
-    # Check if is_listed column exists on items table
-    if 'items' in inspector.get_table_names():
-        columns = [c['name'] for c in inspector.get_columns('items')]
-        if 'is_listed' not in columns:
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in STREAMING_PATHS:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+def auto_migrate():
+    """Add columns and indexes that create_all doesn't add to existing tables. Each step no-ops once applied."""
+    # ADD COLUMN with a DEFAULT fills the existing rows too, so no backfill UPDATE is needed
+    if engine.dialect.name == "sqlite":
+        # SQLite has no ADD COLUMN IF NOT EXISTS - adding a column that's already there just errors
+        try:
             with engine.begin() as conn:
                 conn.execute(text("ALTER TABLE items ADD COLUMN is_listed BOOLEAN DEFAULT TRUE"))
-                conn.execute(text("UPDATE items SET is_listed = TRUE WHERE is_listed IS NULL"))
-                print("Added is_listed column and set all existing items to listed")
+            logger.info("Added is_listed column, existing items default to listed")
+        except OperationalError:
+            pass
+    else:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE items ADD COLUMN IF NOT EXISTS is_listed BOOLEAN DEFAULT TRUE"))
+    
+    # create_all only builds indexes along with new tables, so add any that are missing
+    with engine.begin() as conn:
+        for index in Item.__table__.indexes:
+            conn.execute(CreateIndex(index, if_not_exists=True))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Create tables on startup
-    Base.metadata.create_all(bind=engine)
+    # Log through a background thread so handlers never block the event loop
+    setup_logging()
+    # Create tables on startup (in a thread - the sync engine would block the event loop)
+    await asyncio.to_thread(Base.metadata.create_all, bind=engine)
     # Add missing columns to existing tables
-    auto_migrate()
+    await asyncio.to_thread(auto_migrate)
+    # Open the shared OpenAI and eBay HTTP clients up front
+    ai_identifier.get_http_client()
+    ebay.get_http_client()
     yield
+    await ai_identifier.close_http_client()
+    await ebay.close_http_client()
+    shutdown_logging()
 
 app = FastAPI(
     title="Antique Tracker",
     description="Inventory management for antique & vintage resellers",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # Responses are float-heavy nested models - orjson serializes them much faster than stdlib json
+    default_response_class=ORJSONResponse
 )
 
-# CORS - Allow frontend origins
+# Item lists (base64 photos) and AI/eBay results are large, repetitive JSON that compresses several times over
+app.add_middleware(GZipExceptStreamsMiddleware, minimum_size=1024, compresslevel=5)
+
+# CORS - Allow frontend origins. A frozenset, since Starlette checks every request's Origin with `in`.
+ALLOWED_ORIGINS = frozenset({
+    "https://antique-tracker.onrender.com",
+    "https://hardysdecor.com",
+    "https://www.hardysdecor.com",
+    "https://hardys-interiors.onrender.com",
+    "http://localhost:5173",
+    "http://localhost:3000",
+    "http://localhost:3333",
+})
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
-        "https://antique-tracker.onrender.com",
-        "https://hardysdecor.com",
-        "https://www.hardysdecor.com",
-        "https://hardys-interiors.onrender.com",
-        "http://localhost:5173",
-        "http://localhost:3000",
-        "http://localhost:3333",
-    ],
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE"],
+    allow_headers=["Authorization", "Content-Type"],
+    # Let browsers reuse a preflight for a day instead of re-sending OPTIONS every 10 minutes
+    max_age=86400,
 )
 
 # Routes
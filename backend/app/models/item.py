@@ -1,7 +1,8 @@
 """Item model"""
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey, Enum, Index, text, and_, case
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 import enum
 from app.core.database import Base
 
@@ -32,6 +33,22 @@ class ItemCategory(str, enum.Enum):
 
 class Item(Base):
     __tablename__ = "items"
+    __table_args__ = (
+        # Analytics filters and groups on these (recent sales, purchase weekday/aging, by-store, by-category)
+        Index("ix_items_is_sold_sale_date", "is_sold", "sale_date"),
+        Index("ix_items_is_sold_purchase_date", "is_sold", "purchase_date"),
+        Index("ix_items_store_id_is_sold", "store_id", "is_sold"),
+        Index("ix_items_category_is_sold", "category", "is_sold"),
+        # Newest-first item lists: the admin list, and the public storefront through a partial index
+        # that only holds what's for sale, so it stays small however many sold items pile up
+        Index("ix_items_created_at_id", "created_at", "id"),
+        Index(
+            "ix_items_for_sale_created_at", "created_at", "id",
+            # Spelled the way each dialect renders `is_listed == True, is_sold == False`, so the planner matches it
+            postgresql_where=text("is_listed = true AND is_sold = false"),
+            sqlite_where=text("is_listed = 1 AND is_sold = 0"),
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
@@ -63,8 +80,9 @@ class Item(Base):
     # Public listing
     is_listed = Column(Boolean, default=False)
     
-    # Photo (base64 or URL)
-    photo = Column(Text, nullable=True)
+    # Photo (base64 or URL). Deferred so loading an Item doesn't drag the image along;
+    # it's fetched on first access (list endpoints select it as a column directly).
+    photo = deferred(Column(Text, nullable=True))
     
     # Notes
     notes = Column(Text, nullable=True)
@@ -76,18 +94,33 @@ class Item(Base):
     # Relationships
     store = relationship("Store", backref="items")
     
-    @property
+    # profit and profit_margin also work as SQL expressions (Item.profit), NULL where the Python side gives None,
+    # so analytics can aggregate them in the database
+    @hybrid_property
     def profit(self):
         if self.is_sold and self.sale_price:
             return self.sale_price - self.purchase_price
         return None
     
-    @property
+    @profit.inplace.expression
+    @classmethod
+    def _profit_expression(cls):
+        return case((and_(cls.is_sold == True, cls.sale_price != 0), cls.sale_price - cls.purchase_price))
+    
+    @hybrid_property
     def profit_margin(self):
         if self.is_sold and self.sale_price and self.purchase_price > 0:
             return ((self.sale_price - self.purchase_price) / self.purchase_price) * 100
         return None
     
+    @profit_margin.inplace.expression
+    @classmethod
+    def _profit_margin_expression(cls):
+        return case((
+            and_(cls.is_sold == True, cls.sale_price != 0, cls.purchase_price > 0),
+            (cls.sale_price - cls.purchase_price) / cls.purchase_price * 100
+        ))
+    
     @property
     def days_to_sell(self):
         if self.is_sold and self.sale_date and self.purchase_date:
@@ -1,4 +1,5 @@
 """Services package"""
 from .ebay import ebay_client, EbayMarketData, EbaySoldItem
+from .images import prepare_image
 
-__all__ = ["ebay_client", "EbayMarketData", "EbaySoldItem"]
+__all__ = ["ebay_client", "EbayMarketData", "EbaySoldItem", "prepare_image"]
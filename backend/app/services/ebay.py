@@ -1,12 +1,21 @@
 """eBay API integration for market price research"""
+import asyncio
+import logging
+import re
+import statistics
+import time
 import httpx
+import orjson
 import base64
-from typing import Optional
+from typing import Awaitable, Callable, Optional
 from dataclasses import dataclass
+from app.core.cache import TTLCache
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
 
-@dataclass
+
+@dataclass(slots=True)
 class EbaySoldItem:
     title: str
     price: float
@@ -17,7 +26,7 @@ class EbaySoldItem:
     item_url: str
 
 
-@dataclass
+@dataclass(slots=True)
 class EbayMarketData:
     query: str
     total_found: int
@@ -28,63 +37,210 @@ class EbayMarketData:
     median_price: float
 
 
+# Recent search results, shared by every caller. Sold-item prices move slowly, so an hour is fine.
+SEARCH_CACHE_TTL = 3600
+_search_cache = TTLCache(maxsize=4096, ttl=SEARCH_CACHE_TTL)
+# Searches currently waiting on eBay, so identical concurrent queries share one request
+_inflight: dict[tuple, asyncio.Future] = {}
+# Process-wide cap on concurrent eBay requests, so bursts of shelf scans don't trip eBay's rate limit
+MAX_CONCURRENT_SEARCHES = 32
+_search_semaphore = asyncio.Semaphore(MAX_CONCURRENT_SEARCHES)
+# Circuit breaker: after this many failed requests in a row, stop calling eBay for a while
+# so requests fail straight away instead of each waiting out the timeout
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_COOLDOWN = 30.0
+_consecutive_failures = 0
+_breaker_open_until = 0.0
+
+
+class EbayUnavailableError(Exception):
+    """eBay requests are paused after repeated failures"""
+
+# Shared client for eBay calls so TCP/TLS connections are reused across searches.
+# Created lazily and closed by the app lifespan (see main.py).
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared pooled HTTP client, creating it on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            # eBay normally answers in a second or two; a slow call is better treated as a failure
+            timeout=httpx.Timeout(10.0, connect=3.0),
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+        )
+    return _client
+
+
+async def close_http_client():
+    """Close the shared HTTP client (called on app shutdown)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def normalize_query(query: str) -> str:
+    """Cache key form of a search: case, spacing and word order don't change eBay's results much"""
+    return " ".join(sorted(set(query.lower().split())))
+
+
+def quote_keywords(query: str) -> str:
+    """A query as one quoted Finding API keyword group, without the characters that are keyword syntax"""
+    return '"' + " ".join(re.sub(r'[",()*]', " ", query).split()) + '"'
+
+
+def _finish_search(key: tuple, task: asyncio.Future):
+    _inflight.pop(key, None)
+    if not task.cancelled() and task.exception() is None:
+        _search_cache.set(key, task.result())
+
+
+async def cached_search(key: tuple, fetch: Callable[[], Awaitable[EbayMarketData]]) -> EbayMarketData:
+    """Return a cached result for `key`, join an identical in-flight search, or start `fetch`"""
+    cached = _search_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(call_ebay(fetch))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _finish_search(key, t))
+    # shield: one caller giving up shouldn't cancel the search for everyone else waiting on it
+    return await asyncio.shield(task)
+
+
+async def call_ebay(fetch: Callable[[], Awaitable]):
+    """Make an eBay request under the concurrency cap and the circuit breaker"""
+    global _consecutive_failures, _breaker_open_until
+    if time.monotonic() < _breaker_open_until:
+        raise EbayUnavailableError("eBay requests paused after repeated failures")
+    
+    async with _search_semaphore:
+        try:
+            result = await fetch()
+        except Exception:
+            _consecutive_failures += 1
+            # Past the threshold, a single failure after the cooldown re-opens the breaker
+            if _consecutive_failures >= BREAKER_FAILURE_THRESHOLD:
+                _breaker_open_until = time.monotonic() + BREAKER_COOLDOWN
+                logger.warning("eBay failed %d times in a row, pausing requests for %.0fs", _consecutive_failures, BREAKER_COOLDOWN)
+            raise
+    _consecutive_failures = 0
+    return result
+
+
+def summarize_sales(query: str, total_found: int, items: list[EbaySoldItem], limit: int) -> EbayMarketData:
+    """Price stats over the sold items found for a search"""
+    prices = [item.price for item in items]
+    
+    # Calculate stats
+    if prices:
+        avg_price = sum(prices) / len(prices)
+        min_price = min(prices)
+        max_price = max(prices)
+        median_price = statistics.median(prices)
+    else:
+        avg_price = min_price = max_price = median_price = 0
+    
+    return EbayMarketData(
+        query=query,
+        total_found=total_found,
+        items=items[:limit],
+        avg_price=round(avg_price, 2),
+        min_price=round(min_price, 2),
+        max_price=round(max_price, 2),
+        median_price=round(median_price, 2)
+    )
+
+
 class EbayClient:
     """Client for eBay Browse API to search sold/completed items"""
     
     AUTH_URL = "https://api.ebay.com/identity/v1/oauth2/token"
     BROWSE_URL = "https://api.ebay.com/buy/browse/v1/item_summary/search"
+    # Application tokens last 2 hours; refresh a minute early so in-flight calls don't race the expiry
+    DEFAULT_TOKEN_LIFETIME = 7200
+    TOKEN_REFRESH_MARGIN = 60
+    # Search parameters that are the same for every query
+    BROWSE_PARAMS = {
+        "filter": "buyingOptions:{FIXED_PRICE|AUCTION},conditions:{USED|GOOD|VERY_GOOD|EXCELLENT}",
+        # Sort by most recently ended
+        "sort": "endDate"
+    }
     
     def __init__(self):
         self.app_id = settings.ebay_app_id
         self.cert_id = settings.ebay_cert_id
         self.app_token = settings.ebay_app_token  # Pre-generated token
         self._access_token: Optional[str] = None
-    
-    @property
-    def is_configured(self) -> bool:
-        return bool(self.app_token) or bool(self.app_id)
+        self._token_expiry = 0.0  # time.monotonic() deadline for _access_token
+        # Held while fetching a token, so concurrent searches wait for one auth call instead of each making one
+        self._auth_lock = asyncio.Lock()
+        # Checked on every identify request; settings don't change after startup
+        self.is_configured = bool(self.app_token) or bool(self.app_id)
     
     async def _get_access_token(self) -> str:
-        """Get OAuth token - use pre-generated token if available, otherwise fetch"""
-        if self._access_token:
-            return self._access_token
-        
+        """Get OAuth token - use pre-generated token if available, otherwise fetch and reuse until near expiry"""
         # Use pre-generated Application Token if available
         if self.app_token:
-            self._access_token = self.app_token
-            return self._access_token
+            return self.app_token
         
         if not self.app_id or not self.cert_id:
             raise ValueError("eBay API credentials not configured")
         
+        if self._access_token and time.monotonic() < self._token_expiry - self.TOKEN_REFRESH_MARGIN:
+            return self._access_token
+        
+        async with self._auth_lock:
+            # Another request may have refreshed it while we waited
+            if self._access_token and time.monotonic() < self._token_expiry - self.TOKEN_REFRESH_MARGIN:
+                return self._access_token
+            return await self._fetch_access_token()
+    
+    async def _fetch_access_token(self) -> str:
+        """Request a new client-credentials token"""
         # Base64 encode credentials
         credentials = base64.b64encode(f"{self.app_id}:{self.cert_id}".encode()).decode()
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                self.AUTH_URL,
-                headers={
-                    "Content-Type": "application/x-www-form-urlencoded",
-                    "Authorization": f"Basic {credentials}"
-                },
-                data={
-                    "grant_type": "client_credentials",
-                    "scope": "https://api.ebay.com/oauth/api_scope"
-                }
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"eBay auth failed: {response.text}")
-            
-            data = response.json()
-            self._access_token = data["access_token"]
-            return self._access_token
+        response = await get_http_client().post(
+            self.AUTH_URL,
+            headers={
+                "Content-Type": "application/x-www-form-urlencoded",
+                "Authorization": f"Basic {credentials}"
+            },
+            data={
+                "grant_type": "client_credentials",
+                "scope": "https://api.ebay.com/oauth/api_scope"
+            }
+        )
+        
+        if response.status_code != 200:
+            raise Exception(f"eBay auth failed: {response.text}")
+        
+        data = response.json()
+        self._access_token = data["access_token"]
+        self._token_expiry = time.monotonic() + data.get("expires_in", self.DEFAULT_TOKEN_LIFETIME)
+        return self._access_token
     
     async def search_sold_items(
         self, 
         query: str, 
         limit: int = 20,
         category_id: Optional[str] = None
+    ) -> EbayMarketData:
+        """Search for recently sold items on eBay (cached, see cached_search)"""
+        key = ("browse", normalize_query(query), limit, category_id)
+        return await cached_search(key, lambda: self._search_sold_items(query, limit, category_id))
+    
+    async def _search_sold_items(
+        self,
+        query: str,
+        limit: int,
+        category_id: Optional[str]
     ) -> EbayMarketData:
         """
         Search for recently sold items on eBay.
@@ -98,40 +254,35 @@ class EbayClient:
         params = {
             "q": query,
             "limit": min(limit, 50),
-            "filter": "buyingOptions:{FIXED_PRICE|AUCTION},conditions:{USED|GOOD|VERY_GOOD|EXCELLENT}",
-            # Sort by most recently ended
-            "sort": "endDate"
+            **self.BROWSE_PARAMS
         }
         
         if category_id:
             params["category_ids"] = category_id
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(
-                self.BROWSE_URL,
-                headers={
-                    "Authorization": f"Bearer {token}",
-                    "X-EBAY-C-MARKETPLACE-ID": "EBAY_US",
-                    "X-EBAY-C-ENDUSERCTX": "affiliateCampaignId=<ePNCampaignId>,affiliateReferenceId=<referenceId>"
-                },
-                params=params
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"eBay search failed: {response.text}")
-            
-            data = response.json()
+        response = await get_http_client().get(
+            self.BROWSE_URL,
+            headers={
+                "Authorization": f"Bearer {token}",
+                "X-EBAY-C-MARKETPLACE-ID": "EBAY_US",
+                "X-EBAY-C-ENDUSERCTX": "affiliateCampaignId=<ePNCampaignId>,affiliateReferenceId=<referenceId>"
+            },
+            params=params
+        )
+        
+        if response.status_code != 200:
+            raise Exception(f"eBay search failed: {response.text}")
+        
+        data = orjson.loads(response.content)
         
         # Parse results
         items = []
-        prices = []
         
         for item in data.get("itemSummaries", []):
             price_data = item.get("price", {})
             price = float(price_data.get("value", 0))
             
             if price > 0:
-                prices.append(price)
                 items.append(EbaySoldItem(
                     title=item.get("title", ""),
                     price=price,
@@ -142,30 +293,15 @@ class EbayClient:
                     item_url=item.get("itemWebUrl", "")
                 ))
         
-        # Calculate stats
-        if prices:
-            prices_sorted = sorted(prices)
-            avg_price = sum(prices) / len(prices)
-            min_price = prices_sorted[0]
-            max_price = prices_sorted[-1]
-            mid = len(prices_sorted) // 2
-            median_price = prices_sorted[mid] if len(prices_sorted) % 2 else (prices_sorted[mid-1] + prices_sorted[mid]) / 2
-        else:
-            avg_price = min_price = max_price = median_price = 0
-        
-        return EbayMarketData(
-            query=query,
-            total_found=data.get("total", 0),
-            items=items[:limit],
-            avg_price=round(avg_price, 2),
-            min_price=round(min_price, 2),
-            max_price=round(max_price, 2),
-            median_price=round(median_price, 2)
-        )
+        return summarize_sales(query, data.get("total", 0), items, limit)
     
     # Alias for compatibility with code expecting Finding API method name
     async def find_completed_items(self, query: str, limit: int = 20, sold_only: bool = True) -> EbayMarketData:
         return await self.search_sold_items(query, limit)
+    
+    async def find_completed_items_batch(self, queries: list[str], limit: int = 20, sold_only: bool = True) -> list[EbayMarketData]:
+        # The Browse API has no OR search, so this is just the searches run side by side
+        return await asyncio.gather(*[self.search_sold_items(query, limit) for query in queries])
 
 
 # Alternative: eBay Finding API for completed items (XML-based, older but reliable)
@@ -173,13 +309,27 @@ class EbayFindingClient:
     """Client for eBay Finding API - better for completed/sold item research"""
     
     FINDING_URL = "https://svcs.ebay.com/services/search/FindingService/v1"
+    # eBay rejects longer keyword strings
+    MAX_KEYWORDS_LENGTH = 350
+    # A query needs this many title matches from a combined search before we trust that bucket
+    MIN_BATCH_MATCHES = 3
+    # Request parameters that are the same for every search
+    FINDING_PARAMS = {
+        "OPERATION-NAME": "findCompletedItems",
+        "SERVICE-VERSION": "1.13.0",
+        "RESPONSE-DATA-FORMAT": "JSON",
+        "REST-PAYLOAD": "",
+        "sortOrder": "EndTimeSoonest",
+        # Filter for items that actually sold (value set per search)
+        "itemFilter(0).name": "SoldItemsOnly",
+        # Include price range for sanity
+        "itemFilter(1).name": "MinPrice",
+        "itemFilter(1).value": "1",
+    }
     
     def __init__(self):
         self.app_id = settings.ebay_app_id
-    
-    @property
-    def is_configured(self) -> bool:
-        return bool(self.app_id)
+        self.is_configured = bool(self.app_id)
     
     async def find_completed_items(
         self,
@@ -187,45 +337,97 @@ class EbayFindingClient:
         limit: int = 20,
         sold_only: bool = True
     ) -> EbayMarketData:
+        """Search for completed (sold) items (cached, see cached_search)"""
+        if not self.app_id:
+            raise ValueError("eBay App ID not configured")
+        
+        key = ("finding", normalize_query(query), limit, sold_only)
+        return await cached_search(key, lambda: self._find_completed_items(query, limit, sold_only))
+    
+    async def find_completed_items_batch(
+        self,
+        queries: list[str],
+        limit: int = 20,
+        sold_only: bool = True
+    ) -> list[EbayMarketData]:
         """
-        Search for completed (sold) items using the Finding API.
-        This gives access to items sold in the last 90 days.
+        Search for several queries with one Finding API call.
+        The queries are quoted and OR'd together, and the sales are bucketed back to each query by title;
+        queries left with too few matches (or a combined search eBay rejects) are searched individually.
+        A bucket only holds the matches from one mixed page of results, so it is returned to this caller
+        but never cached as the query's own search.
         """
         if not self.app_id:
             raise ValueError("eBay App ID not configured")
         
+        keys = [("finding", normalize_query(query), limit, sold_only) for query in queries]
+        results: list[Optional[EbayMarketData]] = [_search_cache.get(key) for key in keys]
+        pending = [i for i, result in enumerate(results) if result is None and keys[i] not in _inflight]
+        
+        keywords = "(" + ",".join(quote_keywords(queries[i]) for i in pending) + ")"
+        if len(pending) > 1 and len(keywords) <= self.MAX_KEYWORDS_LENGTH:
+            try:
+                response = await call_ebay(lambda: self._request(keywords, 100, sold_only))
+                # eBay answers a query it doesn't like with ack=Failure and no items
+                items = self._parse_items(response, sold_only)
+                titles = [item.title.lower() for item in items]
+                
+                for i in pending:
+                    terms = keys[i][1].split()
+                    matched = [item for item, title in zip(items, titles) if all(term in title for term in terms)]
+                    if len(matched) >= self.MIN_BATCH_MATCHES:
+                        results[i] = summarize_sales(queries[i], len(matched), matched, limit)
+            except Exception:
+                # Fall back to one search per query below
+                logger.warning("Combined eBay search failed", exc_info=True)
+        
+        missing = [i for i, result in enumerate(results) if result is None]
+        fetched = await asyncio.gather(*[self.find_completed_items(queries[i], limit, sold_only) for i in missing])
+        for i, result in zip(missing, fetched):
+            results[i] = result
+        return results
+    
+    async def _find_completed_items(
+        self,
+        query: str,
+        limit: int,
+        sold_only: bool
+    ) -> EbayMarketData:
+        """
+        Search for completed (sold) items using the Finding API.
+        This gives access to items sold in the last 90 days.
+        """
+        result = await self._request(query, limit, sold_only)
+        items = self._parse_items(result, sold_only)
+        total = int(result.get("paginationOutput", [{}])[0].get("totalEntries", ["0"])[0])
+        return summarize_sales(query, total, items, limit)
+    
+    async def _request(self, keywords: str, limit: int, sold_only: bool) -> dict:
+        """Call findCompletedItems and return the response body"""
         # Build request params
         params = {
-            "OPERATION-NAME": "findCompletedItems",
-            "SERVICE-VERSION": "1.13.0",
+            **self.FINDING_PARAMS,
             "SECURITY-APPNAME": self.app_id,
-            "RESPONSE-DATA-FORMAT": "JSON",
-            "REST-PAYLOAD": "",
-            "keywords": query,
+            "keywords": keywords,
             "paginationInput.entriesPerPage": min(limit, 100),
-            "sortOrder": "EndTimeSoonest",
-            # Filter for items that actually sold
-            "itemFilter(0).name": "SoldItemsOnly",
             "itemFilter(0).value": "true" if sold_only else "false",
-            # Include price range for sanity
-            "itemFilter(1).name": "MinPrice",
-            "itemFilter(1).value": "1",
         }
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(self.FINDING_URL, params=params)
-            
-            if response.status_code != 200:
-                raise Exception(f"eBay Finding API error: {response.text}")
-            
-            data = response.json()
+        response = await get_http_client().get(self.FINDING_URL, params=params)
+        
+        if response.status_code != 200:
+            raise Exception(f"eBay Finding API error: {response.text}")
+        
+        data = orjson.loads(response.content)
         
         # Parse the nested response structure
-        result = data.get("findCompletedItemsResponse", [{}])[0]
+        return data.get("findCompletedItemsResponse", [{}])[0]
+    
+    def _parse_items(self, result: dict, sold_only: bool) -> list[EbaySoldItem]:
+        """Sold items with a price from a findCompletedItems response"""
         search_result = result.get("searchResult", [{}])[0]
         
         items = []
-        prices = []
         
         for item in search_result.get("item", []):
             # Get selling status
@@ -239,43 +441,21 @@ class EbayFindingClient:
                 continue
             
             if price > 0:
-                prices.append(price)
-                
                 # Get image
                 gallery = item.get("galleryURL", [""])[0]
+                condition = item.get("condition")
                 
                 items.append(EbaySoldItem(
                     title=item.get("title", [""])[0],
                     price=price,
                     currency=current_price.get("@currencyId", "USD"),
-                    condition=item.get("condition", [{}])[0].get("conditionDisplayName", ["Unknown"])[0] if item.get("condition") else "Unknown",
+                    condition=condition[0].get("conditionDisplayName", ["Unknown"])[0] if condition else "Unknown",
                     sold_date=item.get("listingInfo", [{}])[0].get("endTime", [""])[0],
                     image_url=gallery if gallery else None,
                     item_url=item.get("viewItemURL", [""])[0]
                 ))
         
-        # Calculate stats
-        if prices:
-            prices_sorted = sorted(prices)
-            avg_price = sum(prices) / len(prices)
-            min_price = prices_sorted[0]
-            max_price = prices_sorted[-1]
-            mid = len(prices_sorted) // 2
-            median_price = prices_sorted[mid] if len(prices_sorted) % 2 else (prices_sorted[mid-1] + prices_sorted[mid]) / 2
-        else:
-            avg_price = min_price = max_price = median_price = 0
-        
-        total = int(result.get("paginationOutput", [{}])[0].get("totalEntries", ["0"])[0])
-        
-        return EbayMarketData(
-            query=query,
-            total_found=total,
-            items=items[:limit],
-            avg_price=round(avg_price, 2),
-            min_price=round(min_price, 2),
-            max_price=round(max_price, 2),
-            median_price=round(median_price, 2)
-        )
+        return items
 
 
 # Use the Finding API client as primary (better for sold items research)
@@ -0,0 +1,88 @@
+"""Image preparation for OpenAI vision requests"""
+import base64
+import binascii
+import io
+from typing import Optional
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# OpenAI shrinks "high" detail images to fit 2048px, then to 768px on the short side,
+# and "low" detail ones to 512px - anything bigger is wasted upload
+MAX_UPLOAD_DIMENSION = 2048
+HIGH_DETAIL_SHORT_SIDE = 768
+LOW_DETAIL_DIMENSION = 512
+# With detail="auto", images smaller than this (longest edge) go as "low", which costs ~85 tokens flat
+HIGH_DETAIL_MIN_DIMENSION = 768
+JPEG_QUALITY = 85
+# Base64 chars decoded to read an image's dimensions - covers the header plus a typical EXIF block
+HEADER_BASE64_CHARS = 128 * 1024
+
+
+def split_data_url(image: str) -> tuple[Optional[str], str]:
+    """Split an image string into (data URL prefix, base64 payload). Prefix is None for raw base64."""
+    if image.startswith("data:image"):
+        prefix, _, payload = image.partition(",")
+        return prefix + ",", payload
+    return None, image
+
+
+def read_image_size(payload: str) -> tuple[int, int]:
+    """Width and height of a base64 image, decoding only the header when that's enough"""
+    if len(payload) > HEADER_BASE64_CHARS:
+        try:
+            return Image.open(io.BytesIO(base64.b64decode(payload[:HEADER_BASE64_CHARS]))).size
+        except (binascii.Error, UnidentifiedImageError, OSError, ValueError):
+            pass  # Header runs past the slice (or odd padding) - decode the whole thing
+    return Image.open(io.BytesIO(base64.b64decode(payload))).size
+
+
+def flatten_to_rgb(img: Image.Image) -> Image.Image:
+    """RGB copy for JPEG, with any transparency laid over white rather than turning black"""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        rgba = img.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+
+def prepare_image(image: str, detail: str = "auto") -> tuple[str, str]:
+    """
+    Turn a base64 string or URL into an (image_url, detail) pair for the vision API.
+
+    Base64 images are downscaled to the size OpenAI would reduce them to anyway, and
+    with detail="auto" small images are sent at "low" detail. URLs are passed through
+    untouched since we can't see their size without downloading them. The full
+    base64 payload is only decoded when the image has to be re-encoded.
+    CPU-bound for large photos - call via asyncio.to_thread from async code.
+    """
+    if image.startswith("http"):
+        return image, "high" if detail == "auto" else detail
+
+    prefix, payload = split_data_url(image)
+    url = image if prefix else f"data:image/jpeg;base64,{image}"
+
+    try:
+        width, height = read_image_size(payload)
+    except (binascii.Error, UnidentifiedImageError, OSError, ValueError):
+        # Not something Pillow understands - let OpenAI deal with it as-is
+        return url, "high" if detail == "auto" else detail
+
+    if detail == "auto":
+        detail = "low" if max(width, height) < HIGH_DETAIL_MIN_DIMENSION else "high"
+
+    if detail == "low":
+        scale = LOW_DETAIL_DIMENSION / max(width, height)
+    else:
+        scale = min(MAX_UPLOAD_DIMENSION / max(width, height), HIGH_DETAIL_SHORT_SIDE / min(width, height))
+
+    if scale < 1:
+        img = Image.open(io.BytesIO(base64.b64decode(payload)))
+        # Re-encoding drops EXIF, so apply its Orientation first or phone portraits arrive sideways
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.LANCZOS)
+        buffer = io.BytesIO()
+        flatten_to_rgb(img).save(buffer, format="JPEG", quality=JPEG_QUALITY)
+        url = "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+    return url, detail